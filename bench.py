@@ -0,0 +1,188 @@
+"""
+Benchmarks for the paragraph formatters
+
+Usage:
+    python bench.py --sizes 10 1000 100000 --widths 40 80 --repeat 5
+    python bench.py --output new.json --baseline old.json
+    python bench.py --hyphenate en-us.hyph --engines greedy knuth-plass
+
+Each engine formats generated text of every size at every width.
+Timed runs come after warmup runs and print nothing; peak memory is
+measured on a separate run, since tracing allocations slows Python
+down. Results are written as JSON, and compared against a baseline
+file if one is given: the exit status is 1 if any median slowed down
+by more than the threshold. With --hyphenate, the engines break words
+with the given compiled patterns; streaming does not hyphenate.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from random import Random
+
+import formatters
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+DEFAULT_WIDTHS = [40, 80, 120]
+
+
+def _knuth_plass(text, width, hyphenator=None):
+    fmt = formatters.KnuthPlassFormatter(width, hyphenator=hyphenator)
+    fmt.format(text)
+    return fmt.cells
+
+
+def _greedy(text, width, hyphenator=None):
+    fmt = formatters.GreedyFormatter(width, hyphenator=hyphenator)
+    fmt.format(text)
+    return fmt.cells
+
+
+def _box_glue(text, width, hyphenator=None):
+    fmt = formatters.BoxGlueFormatter(width, hyphenator=hyphenator)
+    fmt.format(text)
+    return fmt.cells
+
+
+def _streaming(text, width, hyphenator=None):
+    fmt = formatters.KnuthPlassFormatter(width, hyphenator=hyphenator)
+    for _ in fmt.iter_format([text]):
+        pass
+    return None
+
+
+# name: function(text, width, hyphenator) that formats text and returns
+# the number of DP cells it evaluated, or None if the engine doesn't
+# count them
+ENGINES = {
+    'knuth-plass': _knuth_plass,
+    'greedy': _greedy,
+    'box-glue': _box_glue,
+    'streaming': _streaming,
+}
+
+
+def make_corpus(size, seed=0):
+    """
+    <size> words of pseudo-English: word lengths roughly follow
+    those of English prose, with the occasional long word
+    """
+    rand = Random(seed)
+    letters = 'etaoinshrdlcumwfgypbvkjxqz'
+    lengths = [1, 2, 2, 3, 3, 3, 4, 4, 4, 5, 5, 6, 6, 7, 8, 9, 10, 12, 14]
+    return ' '.join(''.join(rand.choice(letters[:rand.randint(8, 26)])
+                            for _ in range(rand.choice(lengths)))
+                    for _ in range(size))
+
+
+def run_case(engine, text, width, repeat, warmup, hyphenator=None):
+    func = ENGINES[engine]
+    for _ in range(warmup):
+        func(text, width, hyphenator)
+    times = []
+    cells = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cells = func(text, width, hyphenator)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func(text, width, hyphenator)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'engine': engine,
+        'words': len(text.split()),
+        'width': width,
+        'repeat': repeat,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'peak_bytes': peak,
+        'cells': cells,
+        'hyphenate': hyphenator is not None,
+    }
+
+
+def case_key(result):
+    key = '%s/%d/%d' % (result['engine'], result['words'], result['width'])
+    return key + '/hyphenated' if result.get('hyphenate') else key
+
+
+def compare(results, baseline, threshold):
+    """cases whose median grew by more than <threshold> (a fraction)"""
+    old = {case_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        prev = old.get(case_key(result))
+        if prev is None or not prev['median']:
+            continue
+        ratio = result['median'] / prev['median']
+        if ratio > 1 + threshold:
+            regressions.append((case_key(result), prev['median'],
+                                result['median'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES),
+                        default=sorted(ENGINES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+                        help='corpus sizes, in words')
+    parser.add_argument('--widths', nargs='+', type=int, default=DEFAULT_WIDTHS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='allowed slowdown of the median, as a fraction')
+    parser.add_argument('--hyphenate', metavar='PATTERNS',
+                        help='compiled hyphenation patterns to break words with')
+    args = parser.parse_args(argv)
+    hyphenator = None
+    if args.hyphenate:
+        from hyphenation import Hyphenator
+        hyphenator = Hyphenator(args.hyphenate)
+
+    results = []
+    for size in args.sizes:
+        text = make_corpus(size, args.seed)
+        for width in args.widths:
+            for engine in args.engines:
+                result = run_case(engine, text, width, args.repeat,
+                                  args.warmup, hyphenator)
+                results.append(result)
+                print('%-12s %8d words  width %3d  median %10.6fs  '
+                      'stdev %9.6fs  peak %10d B  cells %s' % (
+                          engine, size, width, result['median'],
+                          result['stdev'], result['peak_bytes'],
+                          result['cells']))
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(report, out, indent=2)
+    if args.baseline:
+        with open(args.baseline) as src:
+            regressions = compare(results, json.load(src), args.threshold)
+        for key, before, after, ratio in regressions:
+            print('REGRESSION %s: %.6fs -> %.6fs (x%.2f)'
+                  % (key, before, after, ratio))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
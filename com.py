@@ -1,5 +1,12 @@
 from PyQt5 import QtCore, QtGui, QtWidgets
-from random import Random
+import threading
+import time
+
+from formatters import (CharMetrics, FormatCache, FormatStats,  # noqa: F401
+                        GreedyFormatter, KnuthPlassFormatter, Paragraph,
+                        ReflowSession, SearchIndex, SqliteStore, TableMetrics,
+                        balanced_batches, format_document, format_widths,
+                        iter_words, split_paragraphs)
 
 
 # def main():
@@ -7,154 +14,102 @@ from random import Random
 # resultfinal=KnuthPlassFormatter(DEMO_WIDTH).format(MOBY)
 
 
-class KnuthPlassFormatter(object):
-    def __init__(self, width):
-        self.width = width
+class QtFontMetrics(TableMetrics):
+    """
+    TableMetrics for a QFont, in pixels
+    Advances of printable ASCII are read up front, so they can be
+    used from worker threads; others are read as they turn up.
+    """
+    def __init__(self, font, cache_size=65536):
+        self.font = font
+        self._metrics = QtGui.QFontMetricsF(font)
+        advances = {chr(code): self._metrics.horizontalAdvance(chr(code))
+                    for code in range(32, 127)}
+        self.average_width = self._metrics.averageCharWidth()
+        super().__init__(advances, default=self.average_width,
+                         cache_size=cache_size)
 
-    def format(self, text):
-        """
-        Format a paragraph string as fully justified text
-        Args:
-            text: one parapgraph of text to format
-        Returns:
-            formatted text string
-        """
-        self._memo = {}
-        self._parent = {}
-        self.words = text.split()
-        self.best_break(0, len(self.words))
-        return '\n'.join(self.wrapped_lines())
+    def advance(self, char):
+        try:
+            return self.advances[char]
+        except KeyError:
+            width = self.advances[char] = self._metrics.horizontalAdvance(char)
+            return width
 
-    def packed(self, words):
-        """Fit set of words as tightly as possible."""
-        return ' '.join(words)
+    def key(self):
+        return 'qfont-%s' % self.font.toString()
 
-    def expanded(self, words, width):
-        """Fit set of words in <width> chars, padding as needed"""
-        if len(words) == 1:
-            return words[0]
-        unspaced_words = ''.join(words)
-        length = len(unspaced_words)
-        space_left = width - length
-        gaps = [0 for _ in range(len(words) - 1)]
-        while space_left:
-            for idx, gap in enumerate(gaps):
-                if not space_left:
-                    break
-                gaps[idx] += 1
-                space_left -= 1
-        # stable, random distribution of spaces
-        Random(unspaced_words).shuffle(gaps)
-        gaps.append(0)  # one empty gap for zip()
-        spaces = (gap * ' ' for gap in gaps)
-        return ''.join(word + space for word, space in zip(words, spaces))
 
-    def badness(self, i, j):
-        """LaTeX 'badness' function"""
-        # fun: try adding a non-negative value to length
-        length = len(self.packed(self.words[i:j]))  # + 20
-        if length > self.width:
-            return float('inf')
-        else:
-            return (self.width - length) ** 3.0
+# TextFormatter = KnuthPlassFormatter
+# if __name__ == '__main__':
+#    main()
 
-    def best_break(self, i, j):
-        """
-        dynamic program for finding the best locations to place
-        line-breaks in a paragraph when producing fully justified
-        text
-        Args:
-            i: start word index, inclusive
-            j: last word index, inclusive
-        Returns:
-            best (minimum) badness score found
-        Side-effect:
-            _memo & _parent are updated with scores and links
-            for finding the final path through the graph after
-            all line-breaks are found.
-        """
-        try:
-            return self._memo[(i, j)]
-        except KeyError:
-            pass
-        if j == len(self.words):
-            length = len(self.packed(self.words[i:j]))
-            if length <= self.width:
-                # base-case: this is the last line.
-                # it doesn't contribute badness
-                self._memo[(i, j)] = 0
-                self._parent[i] = j
-                return 0
-        # evaluate every possible break position
-        vals = []
-        for n in reversed(range(i, j)):
-            total_badness = self.badness(i, n + 1) + self.best_break(n + 1, j)
-            vals.append((total_badness, n + 1))
-        # choose the break with the minimum total badness
-        best_val, best_idx = min(vals, key=lambda pair: pair[0])
-        self._memo[(i, j)] = best_val
-        self._parent[i] = best_idx
-        return best_val
 
-    def wrapped_lines(self):
-        """
-        render a paragraph of justified text using the graph
-        constructed by best_break()
-        Returns:
-            paragraph (string) of justified text
-        """
-        a = 0
-        b = self._parent[0]
-        while True:
-            words = self.words[a:b]
-            if b == len(self.words):
-                # this is the last line, so
-                # we don't justify the text
-                yield self.packed(words)
-                return
-            yield self.expanded(words, self.width)
-            a = b
-            b = self._parent[a]
+class ConvertSignals(QtCore.QObject):
+    lines = QtCore.pyqtSignal(int, list)
+    finished = QtCore.pyqtSignal(int, object)
+    # sent last by every job, cancelled or not
+    done = QtCore.pyqtSignal(int)
+
 
+class ConvertJob(QtCore.QRunnable):
+    """
+    Formats text on a worker thread, reporting lines as they become
+    final and then a SearchIndex over them; each report is tagged
+    with the job's generation so stale results can be told apart
+    """
+    CHUNK = 4096
+    # report at most once a frame
+    BATCH_SECONDS = 1 / 60
 
-class GreedyFormatter(KnuthPlassFormatter):
-    def format(self, text):
-        """
-        Format a paragraph string as fully justified text
-        using a greedy method
-        Args:
-            text: one parapgraph of text to format
-        Returns:
-            formatted text string
-        """
-        self._memo = {}
-        self._parent = {}
-        self.words = text.split()
-        self.lines = []
-        cur_line = []
-        for word in self.words:
-            tmp = cur_line + [word]
-            if len(self.packed(tmp)) <= self.width:
-                cur_line += [word]
-            else:
-                self.lines.append(cur_line)
-                cur_line = [word]
-        if cur_line:
-            self.lines.append(cur_line)
-        return '\n'.join(self.wrapped_lines())
+    def __init__(self, generation, width, text, metrics=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.generation = generation
+        self.width = width
+        self.text = text
+        self.metrics = metrics
+        self.signals = ConvertSignals()
+        self._cancelled = threading.Event()
 
-    def wrapped_lines(self):
-        last = len(self.lines) - 1
-        for idx, words in enumerate(self.lines):
-            if idx == last:
-                yield self.packed(words)
+    def cancel(self):
+        self._cancelled.set()
+
+    def _chunks(self):
+        # the formatter pulls text a chunk at a time, so stopping
+        # here also stops the line breaking
+        for start in range(0, len(self.text), self.CHUNK):
+            if self._cancelled.is_set():
                 return
-            yield self.expanded(words, self.width)
+            yield self.text[start:start + self.CHUNK]
 
+    def run(self):
+        try:
+            self._convert()
+        finally:
+            self.signals.done.emit(self.generation)
 
-# TextFormatter = KnuthPlassFormatter
-# if __name__ == '__main__':
-#    main()
+    def _convert(self):
+        fmt = KnuthPlassFormatter(self.width, metrics=self.metrics)
+        lines = []
+        batch = []
+        last = time.perf_counter()
+        for line in fmt.iter_format(self._chunks(), check_every=64):
+            if self._cancelled.is_set():
+                return
+            lines.append(line)
+            batch.append(line)
+            now = time.perf_counter()
+            if now - last >= self.BATCH_SECONDS:
+                self.signals.lines.emit(self.generation, batch)
+                batch = []
+                last = now
+        if self._cancelled.is_set():
+            return
+        self.signals.lines.emit(self.generation, batch)
+        index = SearchIndex(lines)
+        if not self._cancelled.is_set():
+            self.signals.finished.emit(self.generation, index)
 
 
 class Ui_Dialog(object):
@@ -386,29 +341,94 @@ class Ui_Dialog(object):
 
         self.retranslateUi(Dialog)
         QtCore.QMetaObject.connectSlotsByName(Dialog)
+        self.setupConversion(Dialog)
+
+    def setupConversion(self, Dialog):
+        self.pool = QtCore.QThreadPool.globalInstance()
+        self.job = None
+        # started jobs by generation, until they send done: the pool
+        # only holds a pointer to them, since they don't auto-delete
+        self.jobs = {}
+        self.generation = 0
+        self.outputLines = []
+        self.searchIndex = None
+        # measures MainOutput's font once one is chosen
+        self.metrics = None
+        # convert once typing pauses
+        self.debounce = QtCore.QTimer(Dialog)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(300)
+        self.debounce.timeout.connect(self.convert)
+        self.MainInput.textEdited.connect(lambda _: self.debounce.start())
+        self.Width.valueChanged.connect(lambda _: self.debounce.start())
 
     def convert(self):
         # resultfinal=KnuthPlassFormatter(DEMO_WIDTH).format(MOBY)
-        resultfinal = KnuthPlassFormatter(
-            self.Width.value()).format(self.MainInput.text())
-        self.MainOutput.setText(resultfinal)
+        self.debounce.stop()
+        if self.job is not None:
+            self.job.cancel()
+        self.generation += 1
+        self.outputLines = []
+        self.searchIndex = None
+        self.MainOutput.setTextFormat(QtCore.Qt.PlainText)
+        self.MainOutput.setText("")
+        width = self.Width.value()
+        if self.metrics is not None:
+            # as wide as <width> average characters of the font
+            width *= self.metrics.average_width
+        self.job = ConvertJob(self.generation, width, self.MainInput.text(),
+                              self.metrics)
+        self.job.signals.lines.connect(self.showLines)
+        self.job.signals.finished.connect(self.conversionDone)
+        self.job.signals.done.connect(self.jobDone)
+        self.jobs[self.generation] = self.job
+        self.pool.start(self.job)
+
+    def showLines(self, generation, lines):
+        if generation != self.generation:
+            return
+        self.outputLines.extend(lines)
+        self.MainOutput.setText('\n'.join(self.outputLines))
+
+    def conversionDone(self, generation, index):
+        if generation == self.generation:
+            self.job = None
+            self.searchIndex = index
+
+    def jobDone(self, generation):
+        # run() has returned, so the pool is through with the job
+        self.jobs.pop(generation, None)
 
     def searchitButton(self):
-        # self.InputText.text().lower()
-        # self.SearchOutput.text().lower()
-        searchIndex = ((self.MainInput.text()).lower()).find(
-            (self.SearchInput.text()).lower())
-        # self.SearchOutput.setText(str(searchIndex))
-        if searchIndex >= 0:
+        # words ending in * match as prefixes
+        query = self.SearchInput.text().strip()
+        prefix = query.endswith('*')
+        query = query.rstrip('*')
+        index = self.searchIndex
+        if index is None:
+            # nothing converted yet: search the input as it stands
+            index = SearchIndex([self.MainInput.text()])
+        matches = index.search(query, prefix=prefix)
+        if matches:
+            line, column, _ = matches[0]
             self.SearchOutput.setText(
-                f"Word found at Index: {str(searchIndex)}")
+                f"Found {len(matches)} match(es), first at line "
+                f"{line + 1}, column {column + 1}")
         else:
             self.SearchOutput.setText("Word not found... Plz try again...")
+        if index is self.searchIndex:
+            self.MainOutput.setTextFormat(QtCore.Qt.RichText)
+            self.MainOutput.setText(index.highlighted(matches))
 
     def fontoptions(self):
         newfontstyle = self.FontStyleInput.currentText()
         newfontsize = self.FontNumberInput.value()
-        self.MainOutput.setFont(QtGui.QFont(newfontstyle, newfontsize))
+        font = QtGui.QFont(newfontstyle, newfontsize)
+        self.MainOutput.setFont(font)
+        self.metrics = QtFontMetrics(font)
+        if self.outputLines:
+            # re-break the lines for the new font
+            self.convert()
 
     def retranslateUi(self, Dialog):
         _translate = QtCore.QCoreApplication.translate
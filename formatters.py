@@ -0,0 +1,1996 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from itertools import accumulate
+from random import Random
+import hashlib
+import heapq
+import io
+import os
+import re
+import string
+import time
+
+
+def iter_words(chunks):
+    """
+    Split an iterable of text chunks into words, joining words
+    that straddle a chunk boundary
+    Args:
+        chunks: iterable of strings, e.g. an open file
+    Returns:
+        generator of words, as text.split() would give for the
+        concatenated chunks
+    """
+    carry = ''
+    for chunk in chunks:
+        if not chunk:
+            continue
+        words = (carry + chunk).split()
+        carry = ''
+        if words and not chunk[-1].isspace():
+            carry = words.pop()
+        yield from words
+    if carry:
+        yield carry
+
+
+class SqliteStore(object):
+    """
+    On-disk table of formatted results, safe to share between
+    processes
+    """
+    def __init__(self, path):
+        import sqlite3
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS results '
+                           '(key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def get(self, key):
+        row = self._conn.execute('SELECT value FROM results WHERE key = ?',
+                                 (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, value):
+        self._conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?)',
+                           (key, value))
+
+    def close(self):
+        self._conn.close()
+
+
+class FormatCache(object):
+    """
+    Bounded LRU of formatted paragraphs, optionally backed by a
+    shared SqliteStore
+    Keys combine a hash of the text with the width, the formatter
+    class, the line cost it minimises and its other settings, so
+    formatters that lay text out differently never share entries.
+    """
+    def __init__(self, maxsize=1024, store=None):
+        self.maxsize = maxsize
+        self.store = store
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(formatter, text):
+        cls = type(formatter)
+        if isinstance(text, Paragraph):
+            text = text.text
+        digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+        key = '%s:%r:%s.%s:%s:%d:%s' % (digest, formatter.width,
+                                        cls.__module__, cls.__qualname__,
+                                        formatter.cost_key(),
+                                        formatter.legacy_spacing,
+                                        formatter.metrics.key())
+        settings = formatter.settings()
+        return key + ':' + settings if settings else key
+
+    def get(self, key):
+        """cached result for key, or None"""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            pass
+        else:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+        if self.store is not None:
+            value = self.store.get(key)
+            if value is not None:
+                self.store_hits += 1
+                self._remember(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if self.store is not None:
+            self.store.put(key, value)
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'store_hits': self.store_hits,
+                'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self._entries)}
+
+
+class FormatStats(object):
+    """
+    Counters and per-phase timings collected by formatters
+    One instance can be shared by many formatters and calls, and
+    instances from separate processes combined with merge().
+    Args:
+        callback: optional function called with a dict of the
+            figures for each paragraph formatted
+    """
+    PHASES = ('tokenize', 'break', 'render')
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.timings = dict.fromkeys(self.PHASES, 0.0)
+        self.paragraphs = 0
+        self.words = 0
+        self.max_words = 0
+        self.cells = 0
+        self.pruned = 0
+        self.lines = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def record(self, words, cells, pruned, lines, timings):
+        self.paragraphs += 1
+        self.words += words
+        self.max_words = max(self.max_words, words)
+        self.cells += cells
+        self.pruned += pruned
+        self.lines += lines
+        for phase, seconds in timings.items():
+            self.timings[phase] += seconds
+        if self.callback is not None:
+            self.callback({'words': words, 'cells': cells, 'pruned': pruned,
+                           'lines': lines, 'timings': timings})
+
+    def merge(self, other):
+        """add the figures of another FormatStats to this one"""
+        self.paragraphs += other.paragraphs
+        self.words += other.words
+        self.max_words = max(self.max_words, other.max_words)
+        self.cells += other.cells
+        self.pruned += other.pruned
+        self.lines += other.lines
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        for phase, seconds in other.timings.items():
+            self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def cache_hit_rate(self):
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
+
+    def as_dict(self):
+        return {'paragraphs': self.paragraphs, 'words': self.words,
+                'max_words': self.max_words, 'cells': self.cells,
+                'pruned': self.pruned, 'lines': self.lines,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'cache_hit_rate': self.cache_hit_rate(),
+                'timings': dict(self.timings)}
+
+    def __getstate__(self):
+        # callbacks are often lambdas, which can't cross processes
+        state = self.__dict__.copy()
+        state['callback'] = None
+        return state
+
+
+class CharMetrics(object):
+    """
+    Measures text in characters, as for a monospaced font
+    A metrics object gives the width of words and of a space in the
+    units the formatter's width is given in.
+    """
+    space = 1
+    typecode = 'q'
+
+    def measure(self, word):
+        return len(word)
+
+    def widths(self, words):
+        """array of the widths of words"""
+        return array(self.typecode, map(len, words))
+
+    def key(self):
+        """identifies the measurements, for cache keys"""
+        return 'chars'
+
+
+class TableMetrics(CharMetrics):
+    """
+    Measures text with per-character advance widths, e.g. pixels
+    for a proportional font
+    Word widths are cached, up to <cache_size> words, and the key
+    worked out once, so the table is not to be changed after
+    construction.
+    Args:
+        advances: {character: advance width}
+        default: width of characters missing from advances
+        space: width of a space, if not in advances
+    """
+    typecode = 'd'
+
+    def __init__(self, advances, default=None, space=None, cache_size=65536):
+        self.advances = dict(advances)
+        if default is None:
+            default = max(self.advances.values(), default=1.0)
+        self.default = default
+        self.space = space if space is not None else self.advance(' ')
+        self.cache_size = cache_size
+        self._words = {}
+        self._key = None
+
+    def advance(self, char):
+        return self.advances.get(char, self.default)
+
+    def measure(self, word):
+        try:
+            return self._words[word]
+        except KeyError:
+            pass
+        width = 0.0
+        for char in word:
+            width += self.advance(char)
+        if len(self._words) >= self.cache_size:
+            self._words.clear()
+        self._words[word] = width
+        return width
+
+    def widths(self, words):
+        return array(self.typecode, map(self.measure, words))
+
+    def key(self):
+        # asked for on every cached format(): hash the table once
+        if self._key is None:
+            table = repr(sorted(self.advances.items())).encode('utf-8')
+            self._key = 'table-%s-%r-%r' % (
+                hashlib.blake2b(table, digest_size=8).hexdigest(),
+                self.default, self.space)
+        return self._key
+
+
+class Paragraph(object):
+    """
+    A paragraph tokenised once, to format at any width and with
+    any formatter
+    Words are kept as offsets into the text rather than as strings,
+    so each costs a few bytes, and prefix sums of their widths are
+    worked out once per metrics. Indexing and iterating give the
+    words as strings, made only when asked for, so formatters take
+    a Paragraph wherever they take a list of words.
+    Args:
+        text: one paragraph of text
+    """
+    __slots__ = ('text', 'starts', 'lengths', '_prefixes')
+
+    def __init__(self, text):
+        self.text = text
+        typecode = 'I' if len(text) < 1 << 32 else 'Q'
+        self.starts = array(typecode)
+        self.lengths = array(typecode)
+        for match in re.finditer(r'\S+', text):
+            start, end = match.span()
+            self.starts.append(start)
+            self.lengths.append(end - start)
+        self._prefixes = {}
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            text = self.text
+            return [text[start:start + length] for start, length
+                    in zip(self.starts[index], self.lengths[index])]
+        start = self.starts[index]
+        return self.text[start:start + self.lengths[index]]
+
+    def __iter__(self):
+        text = self.text
+        for start, length in zip(self.starts, self.lengths):
+            yield text[start:start + length]
+
+    def prefix_sums(self, metrics=None):
+        """as KnuthPlassFormatter.prefix_sums(), kept per metrics"""
+        if metrics is None:
+            metrics = CharMetrics()
+        key = metrics.key()
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            if type(metrics).measure is CharMetrics.measure:
+                widths = self.lengths
+            else:
+                widths = metrics.widths(self)
+            prefix = array(metrics.typecode, accumulate(widths, initial=0))
+            self._prefixes[key] = prefix
+        return prefix
+
+
+def _words(text):
+    """words of a paragraph string, or of a Paragraph as it is"""
+    return text if isinstance(text, Paragraph) else text.split()
+
+
+class KnuthPlassFormatter(object):
+    # badness added for a line that ends in a hyphen
+    hyphen_cost = 100
+    # hyphens[k] is set when breaking before words[k] needs a hyphen;
+    # None when words are whole words
+    _hyphens = None
+    # with a hyphenator, words are only hyphenated if some line of
+    # the first pass has more free space per gap than this, in
+    # spaces, as TeX's pretolerance
+    pretolerance = 1.0
+
+    def __init__(self, width, cache=None, legacy_spacing=False, stats=None,
+                 metrics=None, hyphenator=None):
+        self.width = width
+        self.cache = cache
+        self.stats = stats
+        # widths of words and spaces, in the units of width
+        self.metrics = metrics if metrics is not None else CharMetrics()
+        # place extra spaces with a per-line PRNG, as older
+        # versions did, to reproduce their output exactly
+        self.legacy_spacing = legacy_spacing
+        # a hyphenation.Hyphenator, to break words as well as spaces
+        self.hyphenator = hyphenator
+
+    def cost_key(self):
+        """identifies the line cost minimised, for cache keys"""
+        badness = type(self).badness
+        if badness is KnuthPlassFormatter.badness:
+            cost = 'cubic'
+        else:
+            cost = badness.__module__ + '.' + badness.__qualname__
+        if self.hyphenator is not None:
+            cost += '+%r' % self.hyphen_cost
+        return cost
+
+    def settings(self):
+        """other parameters that change the output, for cache keys"""
+        if self.hyphenator is not None:
+            return '%r,%s' % (self.pretolerance, self.hyphenator.key())
+        return ''
+
+    def format(self, text):
+        """
+        Format a paragraph string as fully justified text
+        Args:
+            text: one parapgraph of text to format, or a Paragraph
+        Returns:
+            formatted text string
+        Side-effect:
+            with a cache, a hit returns the stored result without
+            rebuilding words, _memo or _parent
+        """
+        if self.cache is None:
+            return self._format(text)
+        key = self.cache.key(self, text)
+        result = self.cache.get(key)
+        if self.stats is not None:
+            if result is None:
+                self.stats.cache_misses += 1
+            else:
+                self.stats.cache_hits += 1
+        if result is None:
+            result = self._format(text)
+            self.cache.put(key, result)
+        return result
+
+    def _format(self, text):
+        if self.stats is not None:
+            return self._format_timed(text)
+        self.tokenize(text)
+        self.break_lines()
+        return self.render(self.line_words())
+
+    def _format_timed(self, text):
+        clock = time.perf_counter
+        start = clock()
+        self.tokenize(text)
+        tokenized = clock()
+        self.break_lines()
+        broken = clock()
+        result = self.render(self.line_words())
+        rendered = clock()
+        words = len(self.words)
+        if self._hyphens is not None:
+            # words holds pieces: count the words they make up
+            words -= self._hyphens.count(1)
+        self.stats.record(words, self.cells, self.pruned,
+                          result.count('\n') + 1,
+                          {'tokenize': tokenized - start,
+                           'break': broken - tokenized,
+                           'render': rendered - broken})
+        return result
+
+    def tokenize(self, text):
+        self.words = _words(text)
+        self._hyphens = None
+        self._prefix = self.prefix_sums(self.words, self.metrics)
+
+    def hyphenate(self, words):
+        """
+        Cut words at their hyphenation points
+        Args:
+            words: list of words
+        Returns:
+            (pieces, hyphens): the pieces of every word in order, and
+            a bytearray, one longer than pieces, whose item k is 1
+            where pieces[k] continues the word of pieces[k - 1]
+        """
+        positions = self.hyphenator.positions
+        min_length = self.hyphenator.min_length
+        pieces = []
+        hyphens = bytearray()
+        for word in words:
+            cuts = positions(word) if len(word) >= min_length else ()
+            if not cuts:
+                pieces.append(word)
+                hyphens.append(0)
+                continue
+            start = 0
+            for cut in cuts:
+                pieces.append(word[start:cut])
+                start = cut
+            pieces.append(word[start:])
+            hyphens.append(0)
+            hyphens.extend(b'\x01' * len(cuts))
+        hyphens.append(0)
+        return pieces, hyphens
+
+    def break_lines(self):
+        """
+        best_break() over whole words, and again over their pieces if
+        a hyphenator is set and some line is looser than pretolerance
+        """
+        self.best_break(0, len(self.words))
+        if self.hyphenator is None or self._within(self.pretolerance):
+            return
+        cells, pruned = self.cells, self.pruned
+        self.words, self._hyphens = self.hyphenate(self.words)
+        self._prefix = self.prefix_sums(self.words, self.metrics)
+        self._ends, self._stops = self._piece_offsets()
+        self.best_break(0, len(self.words))
+        self.cells += cells
+        self.pruned += pruned
+
+    def _within(self, tolerance):
+        """
+        whether every line, as best_break() left them, fits the
+        width, and every line but the last with at most tolerance
+        spaces of free space per gap; a line of one word fits only
+        if it fills the width
+        """
+        limit = tolerance * self.metrics.space
+        n = len(self.words)
+        parent = self._parent
+        a = 0
+        while True:
+            b = parent[a]
+            free = self.width - self.line_length(a, b)
+            if free < 0:
+                # overfull, as the last line is after a long word
+                return False
+            if b == n:
+                return True
+            if free > limit * (b - a - 1):
+                return False
+            a = b
+
+    @staticmethod
+    def prefix_sums(words, metrics=None):
+        """prefix[k] is the total width of words[:k], without spaces"""
+        if isinstance(words, Paragraph):
+            return words.prefix_sums(metrics)
+        if metrics is None:
+            metrics = CharMetrics()
+        widths = metrics.widths(words)
+        return array(widths.typecode, accumulate(widths, initial=0))
+
+    def packed(self, words):
+        """Fit set of words as tightly as possible."""
+        return ' '.join(words)
+
+    def expanded(self, words, width):
+        """Fit set of words in <width>, padding as needed"""
+        out = io.StringIO()
+        self.write_expanded(out, words, width)
+        return out.getvalue()
+
+    def gaps(self, words, width):
+        """
+        Spaces to put after each word but the last of a justified line
+        Every gap gets the same share of the free space; the remainder
+        goes one space each to gaps spread evenly along the line.
+        A line wider than <width> keeps a single space per gap.
+        """
+        count = len(words) - 1
+        free = width - sum(map(self.metrics.measure, words))
+        narrow, extra = divmod(int(free // self.metrics.space), count)
+        if narrow < 1:
+            # overflowing: pack rather than run words together
+            return [1] * count
+        if self.legacy_spacing:
+            gaps = [narrow + 1] * extra + [narrow] * (count - extra)
+            # stable, random distribution of spaces
+            Random(''.join(words)).shuffle(gaps)
+            return gaps
+        return [narrow + (idx + 1) * extra // count - idx * extra // count
+                for idx in range(count)]
+
+    def write_expanded(self, out, words, width):
+        """write words to <out> justified to <width>"""
+        if len(words) <= 1:
+            out.write(words[0] if words else '')
+            return
+        for word, gap in zip(words, self.gaps(words, width)):
+            out.write(word)
+            out.write(' ' * gap)
+        out.write(words[-1])
+
+    def render(self, lines):
+        """
+        Justify lines of words into one string, leaving the last
+        line packed
+        Args:
+            lines: iterable of lists of words
+        Returns:
+            paragraph (string) of justified text
+        """
+        out = io.StringIO()
+        prev = None
+        for words in lines:
+            if prev is not None:
+                self.write_expanded(out, prev, self.width)
+                out.write('\n')
+            prev = words
+        if prev is not None:
+            out.write(self.packed(prev))
+        return out.getvalue()
+
+    def line_length(self, i, j):
+        """
+        width of words[i:j] packed with single spaces, with a
+        hyphen if j splits a word
+        """
+        if self._hyphens is not None:
+            return self._stops[j] - self._ends[i]
+        return self._prefix[j] - self._prefix[i] + (j - i - 1) * self.metrics.space
+
+    def badness(self, i, j):
+        """LaTeX 'badness' function"""
+        # fun: try adding a non-negative value to length
+        length = self.line_length(i, j)  # + 20
+        if length > self.width:
+            return float('inf')
+        else:
+            return (self.width - length) ** 3.0
+
+    def best_break(self, i, j):
+        """
+        dynamic program for finding the best locations to place
+        line-breaks in a paragraph when producing fully justified
+        text. The table is filled bottom-up, from the last word back
+        to word i, so long paragraphs do not hit the recursion limit.
+        Args:
+            i: start word index, inclusive
+            j: end word index, exclusive (must be len(self.words))
+        Returns:
+            best (minimum) badness score found
+        Side-effect:
+            _memo & _parent are updated with scores and links
+            for finding the final path through the graph after
+            all line-breaks are found. _memo[k] is the best score
+            for words[k:j] and _parent[k] the end of its first line.
+            cells counts the candidate lines evaluated, pruned the
+            scans cut short by an overflowing line.
+            A subclass that overrides badness() has it called for
+            every candidate line instead.
+        """
+        if j != len(self.words):
+            raise ValueError('best_break only solves suffixes of the paragraph')
+        if type(self).badness is not KnuthPlassFormatter.badness:
+            return self._best_break_custom(i, j)
+        if self._hyphens is not None:
+            return self._best_break_hyphenated(i, j)
+        inf = float('inf')
+        width = self.width
+        space = self.metrics.space
+        # a list indexes faster than the array in the loop below
+        prefix = list(self._prefix)
+        memo = [inf] * (j + 1)
+        parent = [j] * (j + 1)
+        memo[j] = 0
+        cells = 0
+        pruned = 0
+        for start in range(j - 1, i - 1, -1):
+            if prefix[j] - prefix[start] + (j - start - 1) * space <= width:
+                # base-case: this is the last line.
+                # it doesn't contribute badness
+                memo[start] = 0
+                cells += 1
+                continue
+            best_val = inf
+            best_idx = j
+            # candidate lines grow with end; once one overflows
+            # every longer one does too, so stop scanning there
+            for end in range(start + 1, j + 1):
+                length = prefix[end] - prefix[start] + (end - start - 1) * space
+                if length > width:
+                    pruned += 1
+                    break
+                total_badness = (width - length) ** 3.0 + memo[end]
+                # ties go to the later break, as in the recursive version
+                if total_badness <= best_val:
+                    best_val = total_badness
+                    best_idx = end
+            cells += end - start
+            if best_val == inf:
+                best_idx = j
+            memo[start] = best_val
+            parent[start] = best_idx
+        self._memo = memo
+        self._parent = parent
+        self.cells = cells
+        self.pruned = pruned
+        return memo[i]
+
+    def _best_break_custom(self, i, j):
+        """
+        best_break() scoring each line with badness(), as the
+        recursive version did
+        A custom badness need not grow with the line, so no scan is
+        cut short.
+        """
+        inf = float('inf')
+        width = self.width
+        badness = self.badness
+        hyphen_cost = self.hyphen_cost
+        hyphens = self._hyphens
+        # cost[k]: memo[k] plus the cost of the break before word k
+        cost = [inf] * (j + 1)
+        memo = [inf] * (j + 1)
+        parent = [j] * (j + 1)
+        memo[j] = cost[j] = 0
+        cells = 0
+        for start in range(j - 1, i - 1, -1):
+            if self.line_length(start, j) <= width:
+                # base-case: this is the last line.
+                # it doesn't contribute badness
+                best_val = 0
+                cells += 1
+            else:
+                best_val = inf
+                best_idx = j
+                for end in range(start + 1, j + 1):
+                    total_badness = badness(start, end) + cost[end]
+                    # ties go to the later break
+                    if total_badness <= best_val:
+                        best_val = total_badness
+                        best_idx = end
+                cells += j - start
+                if best_val == inf:
+                    best_idx = j
+                parent[start] = best_idx
+            memo[start] = best_val
+            cost[start] = best_val
+            if hyphens is not None and hyphens[start]:
+                cost[start] += hyphen_cost
+        self._memo = memo
+        self._parent = parent
+        self.cells = cells
+        self.pruned = 0
+        return memo[i]
+
+    def _piece_offsets(self):
+        """
+        ends[k] is the width of pieces[:k] with a space after every
+        piece that ends a word; a line from start to end is
+        stops[end] - ends[start] wide, where stops[end] swaps the
+        space after the line for a hyphen, or drops it.
+        """
+        space = self.metrics.space
+        hyphen = self.metrics.measure('-')
+        hyphens = self._hyphens
+        ends = list(self._prefix)
+        spaces = 0
+        for k in range(1, len(ends)):
+            if not hyphens[k]:
+                spaces += space
+            ends[k] += spaces
+        stops = [end + hyphen if flag else end - space
+                 for end, flag in zip(ends, hyphens)]
+        return ends, stops
+
+    def _best_break_hyphenated(self, i, j):
+        """
+        best_break() over word pieces, where a line may also end
+        inside a word, with a hyphen and hyphen_cost added
+        A line from start to end is stops[end] - ends[start] wide,
+        as _piece_offsets() gives them.
+        """
+        inf = float('inf')
+        width = self.width
+        space = self.metrics.space
+        hyphen_cost = self.hyphen_cost
+        hyphens = self._hyphens
+        ends = self._ends
+        stops = self._stops
+        # cost[k]: memo[k] plus the cost of the break before piece k
+        cost = [inf] * (j + 1)
+        memo = [inf] * (j + 1)
+        parent = [j] * (j + 1)
+        memo[j] = cost[j] = 0
+        cells = 0
+        pruned = 0
+        for start in range(j - 1, i - 1, -1):
+            base = ends[start]
+            if stops[j] - base <= width:
+                memo[start] = 0
+                cost[start] = hyphen_cost if hyphens[start] else 0
+                cells += 1
+                continue
+            best_val = inf
+            best_idx = j
+            for end in range(start + 1, j + 1):
+                length = stops[end] - base
+                if length > width:
+                    # the line less its last space grows with end:
+                    # once that overflows, so does every longer line
+                    if ends[end] - base - space > width:
+                        pruned += 1
+                        break
+                    continue
+                total_badness = (width - length) ** 3.0 + cost[end]
+                if total_badness <= best_val:
+                    best_val = total_badness
+                    best_idx = end
+            cells += end - start
+            if best_val == inf:
+                best_idx = j
+            memo[start] = best_val
+            cost[start] = best_val + (hyphen_cost if hyphens[start] else 0)
+            parent[start] = best_idx
+        self._memo = memo
+        self._parent = parent
+        self.cells = cells
+        self.pruned = pruned
+        return memo[i]
+
+    def breakpoints(self):
+        """word indices ending each line, following best_break()'s links"""
+        breaks = []
+        a = 0
+        while True:
+            a = self._parent[a]
+            breaks.append(a)
+            if a == len(self.words):
+                return breaks
+
+    def line_words(self):
+        """
+        the words of each line, following the graph constructed
+        by best_break()
+        """
+        a = 0
+        b = self._parent[0]
+        while True:
+            if self._hyphens is None:
+                yield self.words[a:b]
+            else:
+                yield self._joined(a, b)
+            if b == len(self.words):
+                return
+            a = b
+            b = self._parent[a]
+
+    def _joined(self, a, b):
+        """words of the pieces a..b, hyphenated if b splits a word"""
+        if a == b:
+            return []
+        pieces = self.words
+        hyphens = self._hyphens
+        words = [pieces[a]]
+        for k in range(a + 1, b):
+            if hyphens[k]:
+                words[-1] += pieces[k]
+            else:
+                words.append(pieces[k])
+        if hyphens[b]:
+            words[-1] += '-'
+        return words
+
+    def wrapped_lines(self):
+        """
+        render a paragraph of justified text using the graph
+        constructed by best_break()
+        Returns:
+            generator of lines of justified text
+        """
+        prev = None
+        for words in self.line_words():
+            if prev is not None:
+                yield self.expanded(prev, self.width)
+            prev = words
+        if prev is not None:
+            # this is the last line, so
+            # we don't justify the text
+            yield self.packed(prev)
+
+    def iter_format(self, chunks, check_every=256):
+        """
+        Format a paragraph given as an iterable of text chunks,
+        yielding justified lines as soon as they are final
+        The DP runs forwards: cost[k] is the best score for
+        words[:k] with every line justified. Only starts whose line
+        still fits the width can be extended, so the candidates form
+        a window sliding monotonically over the words. Once every
+        candidate in the window descends from the same breakpoint,
+        the lines before it can no longer change and are emitted,
+        and the table before it is dropped, so memory stays bounded
+        by the window rather than the input.
+        The optimal score equals the one format() finds, although
+        ties between equally good layouts may be broken differently.
+        A word longer than the width is set on a line of its own.
+        Words are not hyphenated, even with a hyphenator, and lines
+        are scored with the built-in badness, even if a subclass
+        overrides badness().
+        Args:
+            chunks: iterable of strings, e.g. an open file
+            check_every: words read between checks for final lines
+        Returns:
+            generator of formatted lines
+        """
+        width = self.width
+        space = self.metrics.space
+        measure = self.metrics.measure
+        inf = float('inf')
+        # tables hold absolute word indices base, base + 1, ...
+        base = 0
+        words = []
+        prefix = [0]
+        cost = [0]
+        parent = [0]
+        emitted = 0  # breakpoint that ends the lines already yielded
+        lo = 0  # first start whose line can still take another word
+        since_check = 0
+        for word in iter_words(chunks):
+            words.append(word)
+            prefix.append(prefix[-1] + measure(word))
+            n = base + len(words)
+            end = prefix[-1]
+            while lo < n - 1 and \
+                    end - prefix[lo - base] + (n - lo - 1) * space > width:
+                lo += 1
+            best_val = inf
+            best_idx = n - 1
+            for start in range(lo, n):
+                length = end - prefix[start - base] + (n - start - 1) * space
+                bad = (width - length) ** 3.0 if length <= width else 0
+                total_badness = cost[start - base] + bad
+                if total_badness <= best_val:
+                    best_val = total_badness
+                    best_idx = start
+            cost.append(best_val)
+            parent.append(best_idx)
+            since_check += 1
+            if since_check < check_every:
+                continue
+            since_check = 0
+            root = self._common_root(parent, base, lo, n)
+            if root > emitted:
+                yield from self._emit_lines(words, parent, base, emitted, root)
+                emitted = root
+                drop = root - base
+                del words[:drop], prefix[:drop], cost[:drop], parent[:drop]
+                base = root
+        n = base + len(words)
+        if not n:
+            yield ''
+            return
+        # the last line is free: pick the cheapest start that fits it
+        end = prefix[-1]
+        best_val = inf
+        last = n - 1
+        for start in range(lo, n):
+            if end - prefix[start - base] + (n - start - 1) * space <= width and \
+                    cost[start - base] <= best_val:
+                best_val = cost[start - base]
+                last = start
+        yield from self._emit_lines(words, parent, base, emitted, last)
+        yield self.packed(words[last - base:])
+
+    @staticmethod
+    def _common_root(parent, base, lo, n):
+        """latest breakpoint shared by the paths to all of lo..n"""
+        heap = [-k for k in range(lo, n + 1)]
+        heapq.heapify(heap)
+        seen = set(heap)
+        while len(seen) > 1:
+            k = -heapq.heappop(heap)
+            seen.discard(-k)
+            p = -parent[k - base]
+            if p not in seen:
+                seen.add(p)
+                heapq.heappush(heap, p)
+        return -heap[0]
+
+    def _emit_lines(self, words, parent, base, start, stop):
+        """justified lines on the path from breakpoint start to stop"""
+        breaks = []
+        k = stop
+        while k > start:
+            breaks.append(k)
+            k = parent[k - base]
+        a = start
+        for b in reversed(breaks):
+            yield self.expanded(words[a - base:b - base], self.width)
+            a = b
+
+
+class GreedyFormatter(KnuthPlassFormatter):
+    def cost_key(self):
+        return 'first-fit'
+
+    def tokenize(self, text):
+        self.words = _words(text)
+
+    def break_lines(self):
+        """break the paragraph using a greedy method"""
+        self.lines = list(self.greedy_lines(self.words))
+        self.cells = len(self.words)
+        self.pruned = 0
+
+    def greedy_lines(self, words):
+        """
+        Pack words onto lines, each as full as it will go
+        Keeps a running line length instead of re-joining the line
+        for every word. A word longer than the width gets a line
+        of its own. With a hyphenator, a word that doesn't fit is
+        hyphenated to fill the line, or the next one if it is wider
+        than the width; only those words are looked up.
+        Args:
+            words: iterable of words
+        Returns:
+            generator of lists of words, one per line
+        """
+        width = self.width
+        space = self.metrics.space
+        measure = self.metrics.measure
+        hyphenator = self.hyphenator
+        hyphen = measure('-')
+        cur_line = []
+        length = -space
+        for word in words:
+            word_width = measure(word)
+            if hyphenator is not None and length + space + word_width > width:
+                cuts = hyphenator.positions(word)
+                while cuts:
+                    room = width - length - space - hyphen
+                    fits = [cut for cut in cuts if measure(word[:cut]) <= room]
+                    if not fits:
+                        if not cur_line or word_width <= width:
+                            break
+                        # too wide for a line of its own as well:
+                        # cut it again from the start of the next
+                        yield cur_line
+                        cur_line = []
+                        length = -space
+                        continue
+                    cut = fits[-1]
+                    cur_line.append(word[:cut] + '-')
+                    yield cur_line
+                    cur_line = []
+                    length = -space
+                    word = word[cut:]
+                    word_width = measure(word)
+                    if word_width <= width:
+                        break
+                    cuts = tuple(k - cut for k in cuts if k > cut)
+            length += word_width + space
+            if length > width and cur_line:
+                yield cur_line
+                cur_line = []
+                length = word_width
+            cur_line.append(word)
+        if cur_line:
+            yield cur_line
+
+    def format_file(self, path, out_path, encoding='utf-8'):
+        """
+        Format a whole file as one paragraph, with constant memory
+        The input is memory-mapped and split on ASCII whitespace as
+        it is read, and each line is written as soon as the next one
+        starts. Words are decoded one at a time, so the encoding must
+        keep ASCII as single bytes and carry no state between them,
+        as UTF-8, Latin-1 or cp1252 do.
+        Args:
+            path: input file
+            out_path: output file, as format() would return plus a
+                final newline
+            encoding: encoding of both files
+        Returns:
+            number of lines written
+        Raises:
+            ValueError: for an encoding such as UTF-16 or ISO-2022
+                that can't be split that way
+        """
+        import codecs
+        import mmap
+        name = codecs.lookup(encoding).name
+        probe = string.printable
+        if name.startswith('iso2022') or probe.encode(encoding) != \
+                probe.encode('ascii'):
+            raise ValueError('format_file() needs an ASCII-compatible '
+                             'encoding, not %s' % encoding)
+        count = 0
+        with open(path, 'rb') as src, \
+                open(out_path, 'w', encoding=encoding) as out:
+            if os.fstat(src.fileno()).st_size:
+                buf = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buf = b''  # empty files can't be mapped
+            try:
+                words = (match.group().decode(encoding)
+                         for match in re.finditer(rb'\S+', buf))
+                prev = None
+                for line in self.greedy_lines(words):
+                    if prev is not None:
+                        self.write_expanded(out, prev, self.width)
+                        out.write('\n')
+                        count += 1
+                    prev = line
+                if prev is not None:
+                    out.write(self.packed(prev))
+                    count += 1
+                out.write('\n')
+            finally:
+                if isinstance(buf, mmap.mmap):
+                    buf.close()
+        return count
+
+    def line_words(self):
+        return iter(self.lines)
+
+
+class Box(object):
+    """Fixed-width material: a word, or part of one"""
+    __slots__ = ('width', 'text')
+
+    def __init__(self, width, text=''):
+        self.width = width
+        self.text = text
+
+
+class Glue(object):
+    """Space that lines may break at, stretch or shrink"""
+    __slots__ = ('width', 'stretch', 'shrink')
+
+    def __init__(self, width, stretch=0, shrink=0):
+        self.width = width
+        self.stretch = stretch
+        self.shrink = shrink
+
+
+class Penalty(object):
+    """
+    A possible breakpoint with a cost: penalty >= INF_PENALTY
+    forbids a break, <= -INF_PENALTY forces one. width and text
+    are only set when the line breaks here, e.g. a hyphen.
+    """
+    __slots__ = ('width', 'penalty', 'flagged', 'text')
+
+    def __init__(self, width, penalty, flagged=False, text=''):
+        self.width = width
+        self.penalty = penalty
+        self.flagged = flagged
+        self.text = text
+
+
+INF_PENALTY = 10000
+
+
+class _Breakpoint(object):
+    """An active node: a feasible break and the best path to it"""
+    __slots__ = ('position', 'fitness', 'total_width', 'total_stretch',
+                 'total_shrink', 'demerits', 'flagged', 'previous')
+
+    def __init__(self, position, fitness, total_width, total_stretch,
+                 total_shrink, demerits, flagged, previous):
+        self.position = position
+        self.fitness = fitness
+        self.total_width = total_width
+        self.total_stretch = total_stretch
+        self.total_shrink = total_shrink
+        self.demerits = demerits
+        self.flagged = flagged
+        self.previous = previous
+
+
+class BoxGlueFormatter(KnuthPlassFormatter):
+    """
+    Knuth and Plass's total-fit algorithm over boxes, glue and
+    penalties
+    Only breaks still reachable by a line that fits are kept
+    active, so the work per item is bounded by the breaks within a
+    line's reach rather than by the paragraph length. With a
+    hyphenator, words are only hyphenated if the paragraph can't
+    be broken within pretolerance without, as in TeX. If no set of
+    lines within tolerance exists, the paragraph is broken again
+    with any underfull line allowed; a word wider than the line
+    gets an overfull line of its own.
+    Args:
+        width: line width
+        tolerance: largest adjustment ratio (stretch used over
+            stretch available) of an acceptable line
+        pretolerance: tolerance of the first pass, without
+            hyphenation
+        line_penalty: demerits added to every line, favouring fewer
+        hyphen_penalty: penalty for breaking at a hyphen
+        flagged_demerits: demerits for two hyphenated lines in a row
+        fitness_demerits: demerits for a line much tighter or looser
+            than the one before
+        stretch: stretch of an interword space, per unit of space
+        shrink: shrink of an interword space, per unit of space;
+            only 0, since text has no space narrower than one
+            character and a shrunk line would overflow the width
+    """
+    def __init__(self, width, tolerance=3.0, pretolerance=1.0,
+                 line_penalty=10, hyphen_penalty=50, flagged_demerits=10000,
+                 fitness_demerits=10000, stretch=1.0, shrink=0.0, **kwargs):
+        super().__init__(width, **kwargs)
+        if shrink:
+            raise ValueError('shrink must be 0: lines are rendered as text, '
+                             'where spaces can not be narrowed')
+        self.tolerance = tolerance
+        self.pretolerance = pretolerance
+        self.line_penalty = line_penalty
+        self.hyphen_penalty = hyphen_penalty
+        self.flagged_demerits = flagged_demerits
+        self.fitness_demerits = fitness_demerits
+        self.stretch = stretch
+        self.shrink = shrink
+
+    def cost_key(self):
+        return 'demerits'
+
+    def settings(self):
+        return '%r,%r,%r,%r,%r,%r,%r,%r,%s' % (
+            self.tolerance, self.pretolerance, self.line_penalty,
+            self.hyphen_penalty, self.flagged_demerits,
+            self.fitness_demerits, self.stretch, self.shrink,
+            super().settings())
+
+    def tokenize(self, text):
+        self.words = _words(text)
+        self.items = self.build_items(self.words)
+
+    def word_parts(self, word, hyphenate=False):
+        """
+        Pieces of word that a line may break between, as
+        (text, hyphen) pairs: hyphen is what the line ends with if
+        it breaks after the piece, or None after the last one
+        """
+        parts = re.split(r'(?<=-)(?=[^-])', word)
+        if hyphenate:
+            split = self.hyphenator.split
+            result = []
+            for part in parts:
+                pieces = split(part)
+                result.extend((piece, '-') for piece in pieces[:-1])
+                result.append((pieces[-1], ''))
+            result[-1] = (result[-1][0], None)
+            return result
+        return [(part, '') for part in parts[:-1]] + [(parts[-1], None)]
+
+    def build_items(self, words, hyphenate=False):
+        """
+        Boxes, glue and penalties for a paragraph of words
+        Words are separated by stretchable glue and may break after
+        a hyphen, or at the hyphenator's points if hyphenate is
+        set; the paragraph ends with infinitely stretchable glue and
+        a forced break, so the last line is set loose. A penalty
+        forbids breaking at that glue, which would leave an empty
+        last line.
+        """
+        measure = self.metrics.measure
+        space = self.metrics.space
+        items = []
+        for word in words:
+            if items:
+                items.append(Glue(space, space * self.stretch,
+                                  space * self.shrink))
+            for text, hyphen in self.word_parts(word, hyphenate):
+                items.append(Box(measure(text), text))
+                if hyphen is not None:
+                    items.append(Penalty(measure(hyphen) if hyphen else 0,
+                                         self.hyphen_penalty, True, hyphen))
+        items.append(Penalty(0, INF_PENALTY))
+        items.append(Glue(0, float('inf'), 0))
+        items.append(Penalty(0, -INF_PENALTY))
+        return items
+
+    def break_lines(self):
+        self.cells = 0
+        self.pruned = 0
+        breaks = None
+        if self.hyphenator is not None:
+            breaks = self.find_breaks(self.items, self.pretolerance)
+            if breaks is None:
+                self.items = self.build_items(self.words, hyphenate=True)
+        if breaks is None:
+            breaks = self.find_breaks(self.items, self.tolerance)
+        if breaks is None:
+            breaks = self.find_breaks(self.items, float('inf'))
+        self._breaks = breaks
+
+    def find_breaks(self, items, tolerance):
+        """
+        Optimal breakpoints for a list of items
+        Args:
+            items: Box, Glue and Penalty objects, ending in a forced
+                break
+            tolerance: largest adjustment ratio allowed
+        Returns:
+            item indices of the line ends, or None if some line had
+            to be set overfull at this tolerance
+        """
+        active = [_Breakpoint(-1, 1, 0, 0, 0, 0, False, None)]
+        sums = [0, 0, 0]
+        final = tolerance == float('inf')
+        prev_box = False
+        for b, item in enumerate(items):
+            if isinstance(item, Box):
+                sums[0] += item.width
+                prev_box = True
+                continue
+            if isinstance(item, Glue):
+                if prev_box:
+                    active, overfull = self._try_break(items, active, b, sums,
+                                                       tolerance)
+                    if overfull and not final:
+                        return None
+                sums[0] += item.width
+                sums[1] += item.stretch
+                sums[2] += item.shrink
+            elif item.penalty < INF_PENALTY:
+                active, overfull = self._try_break(items, active, b, sums,
+                                                   tolerance)
+                if overfull and not final:
+                    return None
+            prev_box = False
+        node = min(active, key=lambda node: node.demerits)
+        breaks = []
+        while node.previous is not None:
+            breaks.append(node.position)
+            node = node.previous
+        breaks.reverse()
+        return breaks
+
+    def _try_break(self, items, active, b, sums, tolerance):
+        """
+        Consider a break at items[b] from every active node
+        Returns:
+            (new active list, whether an overfull line was forced)
+        """
+        item = items[b]
+        if isinstance(item, Penalty):
+            penalty = item.penalty
+            extra = item.width
+            flagged = item.flagged
+        else:
+            penalty = extra = 0
+            flagged = False
+        forced = penalty <= -INF_PENALTY
+        width = self.width
+        line_penalty = self.line_penalty
+        flagged_demerits = self.flagged_demerits
+        fitness_demerits = self.fitness_demerits
+        if penalty >= 0:
+            penalty_demerits = penalty * penalty
+        elif forced:
+            penalty_demerits = 0
+        else:
+            penalty_demerits = -penalty * penalty
+        inf = float('inf')
+        sum_width, sum_stretch, sum_shrink = sums
+        best = [None] * 4
+        kept = []
+        dropped = None
+        for node in active:
+            length = sum_width - node.total_width + extra
+            if length < width:
+                stretch = sum_stretch - node.total_stretch
+                ratio = (width - length) / stretch if stretch > 0 else inf
+            elif length > width:
+                shrink = sum_shrink - node.total_shrink
+                ratio = (width - length) / shrink if shrink > 0 else -inf
+            else:
+                ratio = 0.0
+            if ratio < -1 or forced:
+                # no longer line from this node can fit either
+                if ratio < -1:
+                    self.pruned += 1
+                # active is in order of position: keep the latest
+                if dropped is None or node.position != dropped.position or \
+                        node.demerits < dropped.demerits:
+                    dropped = node
+            else:
+                kept.append(node)
+            if ratio < -1 or ratio > tolerance:
+                continue
+            self.cells += 1
+            if ratio < -0.5:
+                fitness = 0
+                badness = -100 * ratio * ratio * ratio
+            else:
+                fitness = 1 if ratio <= 0.5 else 2 if ratio <= 1 else 3
+                badness = 100 * ratio * ratio * ratio if ratio >= 0 else \
+                    -100 * ratio * ratio * ratio
+                if badness > INF_PENALTY:
+                    badness = INF_PENALTY
+            demerits = (line_penalty + badness) ** 2 + penalty_demerits + \
+                node.demerits
+            if flagged and node.flagged:
+                demerits += flagged_demerits
+            if fitness - node.fitness > 1 or node.fitness - fitness > 1:
+                demerits += fitness_demerits
+            entry = best[fitness]
+            if entry is None or demerits < entry[0]:
+                best[fitness] = (demerits, node)
+
+        overfull = False
+        candidates = [entry for entry in best if entry is not None]
+        if not candidates:
+            if kept or dropped is None:
+                return kept, False
+            # every line from here overflows: set the shortest one
+            # overfull rather than lose the paragraph
+            overfull = True
+            best[1] = (dropped.demerits + (line_penalty + INF_PENALTY) ** 2,
+                       dropped)
+            candidates = [best[1]]
+        totals = self._totals_after(items, b, sums)
+        limit = min(entry[0] for entry in candidates) + fitness_demerits
+        for fitness, entry in enumerate(best):
+            if entry is not None and entry[0] <= limit:
+                kept.append(_Breakpoint(b, fitness, totals[0], totals[1],
+                                        totals[2], entry[0], flagged,
+                                        entry[1]))
+        return kept, overfull
+
+    @staticmethod
+    def _totals_after(items, b, sums):
+        """running sums at the start of the line after a break at b"""
+        total_width, total_stretch, total_shrink = sums
+        for k in range(b, len(items)):
+            item = items[k]
+            if isinstance(item, Glue):
+                total_width += item.width
+                total_stretch += item.stretch
+                total_shrink += item.shrink
+            elif isinstance(item, Box) or \
+                    (k > b and item.penalty <= -INF_PENALTY):
+                break
+        return total_width, total_stretch, total_shrink
+
+    def line_words(self):
+        """words of each line; boxes between two glues make one word"""
+        items = self.items
+        start = 0
+        for end in self._breaks:
+            words = []
+            current = ''
+            for item in items[start:end]:
+                if isinstance(item, Box):
+                    current += item.text
+                elif isinstance(item, Glue) and current:
+                    words.append(current)
+                    current = ''
+            if isinstance(items[end], Penalty):
+                current += items[end].text
+            if current:
+                words.append(current)
+            yield words
+            start = end + 1
+
+
+class ReflowSession(object):
+    """
+    A paragraph kept justified across edits
+    The best_break() tables are kept between calls. _memo[k] only
+    depends on the words from k on, so an edit leaves every entry
+    after it untouched. Entries before it are recomputed back from
+    the edit until a line's worth of them has moved by the same
+    amount with the same breaks, after which the rest only move by
+    that amount too. That move is not applied to them: _steps holds
+    (boundary, delta) pairs, sorted by boundary, and the score for
+    words[k:] is _memo[k] plus the deltas of the boundaries above k.
+    They are folded into _memo once there are more than _MAX_STEPS.
+    Line lengths are kept per start (_next) rather than as absolute
+    parents, 0 standing for the rest of the paragraph, so entries
+    after an edit need no renumbering. Only the lines whose breaks
+    or words changed are re-rendered.
+    An edit still costs the few hundred starts recomputed before it
+    settles, about 3 ms on prose at width 72, short of a
+    sub-millisecond reflow.
+    """
+    _MAX_STEPS = 64
+
+    def __init__(self, width, text=''):
+        self.width = width
+        self.formatter = KnuthPlassFormatter(width)
+        self.words = []
+        self._sizes = []
+        self._memo = [0]
+        self._steps = []
+        self._next = [0]
+        self._breaks = [0]
+        self.lines = ['']
+        self._span = (width + 1) // 2 + 1
+        self.apply_edit(0, 0, text)
+
+    def text(self):
+        return '\n'.join(self.lines)
+
+    def set_text(self, text):
+        """
+        Replace the whole text, reusing the words it shares with the
+        current text at either end
+        Returns:
+            as apply_edit()
+        """
+        new_words = text.split()
+        old_words = self.words
+        limit = min(len(new_words), len(old_words))
+        start = 0
+        while start < limit and new_words[start] == old_words[start]:
+            start += 1
+        tail = 0
+        while tail < limit - start and \
+                new_words[-1 - tail] == old_words[-1 - tail]:
+            tail += 1
+        return self.apply_edit(start, len(old_words) - tail,
+                               new_words[start:len(new_words) - tail])
+
+    def apply_edit(self, start, end, replacement):
+        """
+        Replace words[start:end] and re-justify
+        Args:
+            start: first word index replaced, inclusive
+            end: last word index replaced, exclusive
+            replacement: text, or list of words, to put in their place
+        Returns:
+            (first, removed, new_lines): lines[first:first + removed]
+            were replaced by new_lines
+        """
+        if isinstance(replacement, str):
+            replacement = replacement.split()
+        if self.words[start:end] == replacement:
+            return min(bisect_right(self._breaks, start),
+                       len(self._breaks) - 1), 0, []
+        old_empty = not self.words
+        old_tail_start = self._tail_start()
+        new_end = start + len(replacement)
+        self.words[start:end] = replacement
+        self._sizes[start:end] = map(len, replacement)
+        self._memo[start:end] = [0] * len(replacement)
+        self._next[start:end] = [0] * len(replacement)
+        shift = new_end - end
+        for step in self._steps:
+            if step[0] >= end:
+                step[0] += shift
+            elif step[0] > start:
+                # inside the edit, which _solve() recomputes
+                step[0] = start
+        stable = self._solve(start, new_end, old_tail_start)
+        if old_empty or not self.words:
+            first = 0
+        else:
+            # lines starting before stable keep their breaks, as long
+            # as they end before the edit and are not the last line
+            breaks = self._breaks
+            first = min(bisect_left(breaks, stable) + 1 if stable else 0,
+                        bisect_right(breaks, start), len(breaks) - 1)
+        return self._rechain(first, start, new_end, new_end - end)
+
+    def _tail_start(self):
+        """first word index from which the rest fits on one line"""
+        sizes = self._sizes
+        tail_start = len(sizes)
+        length = -1
+        while tail_start > 0:
+            length += sizes[tail_start - 1] + 1
+            if length > self.width:
+                break
+            tail_start -= 1
+        return tail_start
+
+    def _solve(self, start, new_end, old_tail_start):
+        """
+        recompute _memo and _next below new_end, stopping once the
+        entries before start have settled
+        Returns:
+            index below which _next is unchanged
+        """
+        inf = float('inf')
+        width = self.width
+        sizes = self._sizes
+        memo = self._memo
+        nxt = self._next
+        n = len(sizes)
+        tail_start = self._tail_start()
+        # the entries read past the edit, the end of the paragraph
+        # included, must share one offset: move the boundaries among
+        # them past the last one read
+        steps = self._steps
+        reach = min(n + 1, new_end + self._span)
+        moved = 0
+        for step in steps:
+            if new_end < step[0] < reach:
+                boundary, step_delta = step
+                memo[boundary:reach] = map((-step_delta).__add__,
+                                           memo[boundary:reach])
+                step[0] = reach
+                moved += 1
+        if moved > 1:
+            self._merge_steps()
+            steps = self._steps
+        # steps among the entries recomputed, the highest first;
+        # passed adds up the deltas of those above k
+        inside = [step for step in steps if step[0] <= new_end]
+        inside.reverse()
+        # that offset, for entries given outright
+        zero = -sum(step[1] for step in steps if step[0] > new_end)
+        next_step = 0
+        passed = 0
+        run = 0
+        delta = 0
+        for k in range(new_end - 1, -1, -1):
+            while next_step < len(inside) and inside[next_step][0] > k:
+                passed += inside[next_step][1]
+                next_step += 1
+            best_len = 0
+            if k >= tail_start:
+                # base-case: this is the last line
+                best_val = zero
+            else:
+                best_val = inf
+                length = -1
+                for end in range(k + 1, n + 1):
+                    length += sizes[end - 1] + 1
+                    if length > width:
+                        break
+                    total_badness = (width - length) ** 3.0 + memo[end]
+                    if total_badness <= best_val:
+                        best_val = total_badness
+                        best_len = end - k
+                if best_val == inf:
+                    # as in best_break(): the rest as one line
+                    best_len = 0
+            if k < start:
+                if k < tail_start and k < old_tail_start and \
+                        best_len == nxt[k] and best_val != inf and \
+                        memo[k] != inf:
+                    diff = best_val - memo[k] - passed
+                    if run and diff == delta:
+                        run += 1
+                    else:
+                        delta = diff
+                        run = 1
+                else:
+                    run = 0
+            memo[k] = best_val
+            nxt[k] = best_len
+            if run >= self._span:
+                # entries below k move by delta, on top of the steps
+                # passed, whose boundaries were recomputed
+                self._steps = [step for step in steps
+                               if not k < step[0] <= new_end]
+                if delta + passed:
+                    insort(self._steps, [k, delta + passed])
+                    self._merge_steps()
+                return k
+        self._steps = [step for step in steps if step[0] > new_end]
+        return 0
+
+    def _merge_steps(self):
+        """
+        join steps with the same boundary, and fold them all into
+        _memo once there are more than _MAX_STEPS
+        """
+        steps = self._steps
+        merged = []
+        for step in steps:
+            if merged and merged[-1][0] == step[0]:
+                merged[-1][1] += step[1]
+            else:
+                merged.append(step)
+        if len(merged) > self._MAX_STEPS:
+            memo = self._memo
+            offset = 0
+            for idx in range(len(merged) - 1, -1, -1):
+                boundary, step_delta = merged[idx]
+                offset += step_delta
+                lo = merged[idx - 1][0] if idx else 0
+                memo[lo:boundary] = map(offset.__add__, memo[lo:boundary])
+            merged = []
+        self._steps = merged
+
+    def _rechain(self, first, start, new_end, shift):
+        """
+        follow the new breaks from line <first> until they rejoin
+        the old ones after the edit, and splice in the lines that
+        changed
+        """
+        old_breaks = self._breaks
+        words = self.words
+        nxt = self._next
+        n = len(words)
+        pos = old_breaks[first - 1] if first else 0
+        breaks = []
+        last = len(old_breaks)
+        while True:
+            pos = pos + nxt[pos] if nxt[pos] else n
+            breaks.append(pos)
+            if pos >= n:
+                break
+            if pos >= new_end:
+                idx = bisect_left(old_breaks, pos - shift)
+                if idx < len(old_breaks) and old_breaks[idx] == pos - shift:
+                    # merged: the old breaks from here on still hold
+                    last = idx + 1
+                    break
+        # lines ending where they did, before the edit, are unchanged
+        # unless they were the last line
+        same = 0
+        while same < len(breaks) - 1 and breaks[same] <= start and \
+                first + same < len(old_breaks) - 1 and \
+                breaks[same] == old_breaks[first + same]:
+            same += 1
+        a = breaks[same - 1] if same else old_breaks[first - 1] if first else 0
+        first += same
+        new_lines = []
+        for b in breaks[same:]:
+            if b == n:
+                new_lines.append(self.formatter.packed(words[a:b]))
+            else:
+                new_lines.append(self.formatter.expanded(words[a:b], self.width))
+            a = b
+        removed = last - first
+        tail = old_breaks[last:]
+        if shift:
+            tail = [b + shift for b in tail]
+        self._breaks = old_breaks[:first] + breaks[same:] + tail
+        self.lines[first:last] = new_lines
+        return first, removed, new_lines
+
+
+class SearchIndex(object):
+    """
+    Inverted index over the words of formatted text
+    Words are case-folded and stripped of surrounding punctuation,
+    and each occurrence is kept as the
+    (line, column) where it starts in the lines given, so hits can
+    be shown in the justified output. A sorted vocabulary answers
+    prefix queries with a binary search.
+    """
+    def __init__(self, lines):
+        self.lines = lines
+        self.positions = []
+        self.lengths = []
+        self._folded = []
+        self._postings = {}
+        for line_no, line in enumerate(lines):
+            column = 0
+            for word in line.split():
+                column = line.find(word, column)
+                folded = self.fold(word)
+                self._postings.setdefault(folded, []).append(len(self.positions))
+                self._folded.append(folded)
+                self.positions.append((line_no, column))
+                self.lengths.append(len(word))
+                column += len(word)
+        self._vocab = sorted(self._postings)
+
+    @staticmethod
+    def fold(word):
+        """the form words are indexed and searched by"""
+        return word.strip(string.punctuation).casefold()
+
+    def _word_hits(self, term, prefix):
+        if not prefix:
+            return self._postings.get(term, [])
+        hits = []
+        idx = bisect_left(self._vocab, term)
+        while idx < len(self._vocab) and self._vocab[idx].startswith(term):
+            hits.extend(self._postings[self._vocab[idx]])
+            idx += 1
+        hits.sort()
+        return hits
+
+    def search(self, query, prefix=False):
+        """
+        Find every occurrence of the words of query, in sequence
+        Args:
+            query: one or more words, matched case-insensitively;
+                a word with nothing left once folded matches nothing
+            prefix: match the last word of query as a prefix
+        Returns:
+            list of (line, column, length) per occurrence, where
+            length is that of its first word
+        """
+        terms = [self.fold(term) for term in query.split()]
+        if not terms or not all(terms):
+            # a term of punctuation alone folds to '', which would
+            # match every word as a prefix
+            return []
+        starts = self._word_hits(terms[0], prefix and len(terms) == 1)
+        matches = []
+        for start in starts:
+            end = start + len(terms)
+            if end > len(self._folded):
+                break
+            rest = self._folded[start + 1:end]
+            if len(terms) > 1 and (rest[:-1] != terms[1:-1] or not (
+                    rest[-1].startswith(terms[-1]) if prefix
+                    else rest[-1] == terms[-1])):
+                continue
+            line, column = self.positions[start]
+            matches.append((line, column, self.lengths[start]))
+        return matches
+
+    def highlighted(self, matches, color='#3ce7c3'):
+        """the lines as rich text, with each match's first word marked"""
+        import html
+        by_line = {}
+        for line, column, length in matches:
+            by_line.setdefault(line, []).append((column, length))
+        out = io.StringIO()
+        out.write('<div style="white-space:pre">')
+        for line_no, line in enumerate(self.lines):
+            if line_no:
+                out.write('\n')
+            pos = 0
+            for column, length in sorted(by_line.get(line_no, ())):
+                out.write(html.escape(line[pos:column]))
+                out.write('<span style="background-color:%s">%s</span>'
+                          % (color, html.escape(line[column:column + length])))
+                pos = column + length
+            out.write(html.escape(line[pos:]))
+        out.write('</div>')
+        return out.getvalue()
+
+
+def _sweep_parents(prefix, widths, block=512):
+    """
+    best_break() for many widths at once, vectorised over the
+    widths and the candidate line ends
+    The costs of every candidate line are worked out a block of
+    starts at a time, leaving only a sum and a minimum per start in
+    the loop. Scores are kept for a line's reach of starts only.
+    Args:
+        prefix: prefix sums of the word widths
+        widths: line widths, ascending
+        block: starts whose line costs are worked out together
+    Returns:
+        array with a column per width: row k is the number of words
+        on the first line of words[k:], or 0 where best_break()
+        takes the rest of the paragraph as one line
+    """
+    import numpy as np
+    n = len(prefix) - 1
+    widths_i = np.asarray(widths, dtype=np.intp)
+    max_width = max(widths)
+    # a line of k words is at least 2k - 1 long, which caps k
+    span = (max_width + 1) // 2 + 1
+    rows = np.arange(len(widths))
+    # words[s:e] packed is ends[e] - ends[s] - 1 long; past the last
+    # word, lines are too long for any width
+    ends = np.asarray(prefix, dtype=np.intp) + np.arange(n + 1)
+    ends = np.concatenate([ends, np.full(span, ends[n] + max_width + 2)])
+    # ends of lines from each start that fit the widest width
+    counts = np.searchsorted(ends[:n + 1], ends[:n] + max_width + 1,
+                             side='right') - np.arange(1, n + 1)
+    # the first start from which the rest fits the widest width
+    tail_start = int(np.searchsorted(ends[:n], ends[n] - max_width - 1))
+    # the widest word from each start on; past a word that overflows
+    # a width, best_break() gives up and takes the rest as one line
+    word_widths = np.diff(np.asarray(prefix, dtype=np.intp))
+    widest = np.maximum.accumulate(word_widths[::-1])[::-1]
+    lengths = np.zeros((n + 1, len(widths)), dtype=np.min_scalar_type(span))
+    counts = counts.tolist()
+    # cost of a line by its slack, offset so that every overflowing
+    # line maps to the infinite costs below zero
+    slack = np.arange(-max_width - 1, max_width + 1, dtype=np.float64)
+    cube = np.where(slack < 0, np.inf, slack * slack * slack)
+    shifted = widths_i + max_width + 1
+    # memo[:, col - s] is the score of words[s:] at each width, for
+    # the starts after the block and a line's reach beyond it, so
+    # that the ends of the lines from a start run back to front
+    for hi in range(n, 0, -block):
+        lo = max(0, hi - block)
+        col = hi + span
+        memo = np.empty((len(widths), col - lo + 1))
+        if hi == n:
+            memo[:, :span] = np.inf
+            memo[:, span] = 0
+        else:
+            memo[:, :span + 1] = tail
+        depth = max(counts[lo:hi])
+        if depth:
+            # costs[s - lo, :, d] is that of the line of depth - d
+            # words from s; a whole number of characters of slack
+            # cubes exactly, as in best_break()
+            stops = np.arange(lo, hi)[:, None] + np.arange(depth, 0, -1)
+            line = np.minimum(ends[stops] - ends[lo:hi, None] - 1,
+                              max_width + 1)
+            costs = cube[shifted[:, None] - line[:, None, :]]
+        for start in range(hi - 1, lo - 1, -1):
+            count = counts[start]
+            if count == 0:
+                # the first word overflows every width
+                memo[:, col - start] = np.inf
+                continue
+            here = col - start
+            totals = costs[start - lo, :, depth - count:] + \
+                memo[:, here - count:here]
+            # the first minimum is the latest break, as in best_break()
+            best = totals.argmin(axis=1)
+            score = totals[rows, best]
+            lengths[start] = count - best
+            if start >= tail_start:
+                # base-case: the rest is the last line
+                score[ends[n] - ends[start] - 1 <= widths_i] = 0.0
+            memo[:, here] = score
+        # zero where the rest is one line
+        lengths[lo:hi][(ends[n] - ends[lo:hi, None] - 1 <= widths_i) |
+                       (widest[lo:hi, None] > widths_i)] = 0
+        tail = memo[:, -span - 1:].copy()
+    return lengths
+
+
+def format_widths(text, widths, render=True):
+    """
+    Format one paragraph at several widths, tokenising once
+    Args:
+        text: one parapgraph of text to format, or a Paragraph
+        widths: iterable of line widths
+        render: if False, skip justification and return breakpoints
+    Returns:
+        {width: formatted text string}, as KnuthPlassFormatter(width)
+        would give, or {width: list of word indices ending each line}
+    """
+    try:
+        import numpy
+    except ImportError:  # numpy is optional, fall back to one DP per width
+        numpy = None
+    words = _words(text)
+    prefix = KnuthPlassFormatter.prefix_sums(words)
+    widths = sorted(set(widths))
+    if numpy is not None and words and widths:
+        lengths = _sweep_parents(prefix, widths)
+        starts = numpy.arange(len(words) + 1)
+    else:
+        lengths = None
+    results = {}
+    for col, width in enumerate(widths):
+        fmt = KnuthPlassFormatter(width)
+        fmt.words = words
+        fmt._prefix = prefix
+        if lengths is not None:
+            line = lengths[:, col]
+            fmt._parent = numpy.where(line == 0, len(words),
+                                      starts + line).tolist()
+        else:
+            fmt.best_break(0, len(words))
+        if render:
+            results[width] = '\n'.join(fmt.wrapped_lines())
+        else:
+            results[width] = fmt.breakpoints()
+    return results
+
+
+def split_paragraphs(text):
+    """split text on blank lines, dropping empty paragraphs"""
+    return [p for p in re.split(r'\n[ \t\r\f\v]*\n', text) if p.strip()]
+
+
+def balanced_batches(paragraphs, count):
+    """
+    Group paragraphs into about <count> contiguous batches
+    of similar total size
+    Args:
+        paragraphs: list of paragraph strings
+        count: number of batches wanted
+    Returns:
+        list of lists of paragraphs, in their original order
+    """
+    total = sum(len(p) for p in paragraphs)
+    target = max(1, total // max(1, count))
+    batches = []
+    cur_batch = []
+    cur_size = 0
+    for paragraph in paragraphs:
+        cur_batch.append(paragraph)
+        cur_size += len(paragraph)
+        if cur_size >= target:
+            batches.append(cur_batch)
+            cur_batch = []
+            cur_size = 0
+    if cur_batch:
+        batches.append(cur_batch)
+    return batches
+
+
+def _format_batch(formatter, width, paragraphs, collect_stats=False,
+                  hyphenator=None):
+    fmt = formatter(width, stats=FormatStats() if collect_stats else None,
+                    hyphenator=hyphenator)
+    return [fmt.format(paragraph) for paragraph in paragraphs], fmt.stats
+
+
+def format_document(text, width, workers=1, formatter=KnuthPlassFormatter,
+                    batches_per_worker=4, stats=None, hyphenator=None):
+    """
+    Format a document of blank-line separated paragraphs
+    Args:
+        text: document text
+        width: line width
+        workers: number of processes, 1 formats in this process
+        formatter: KnuthPlassFormatter, GreedyFormatter or a subclass
+        batches_per_worker: batches handed to each process, more
+            evens out the load at some extra pickling cost
+        stats: optional FormatStats, updated with the figures of
+            every paragraph, whichever process formatted it
+        hyphenator: optional hyphenation.Hyphenator; each process
+            maps its pattern file again rather than copying it
+    Returns:
+        formatted text string, paragraphs separated by a blank line
+    """
+    paragraphs = split_paragraphs(text)
+    if workers <= 1 or len(paragraphs) <= 1:
+        fmt = formatter(width, stats=stats, hyphenator=hyphenator)
+        results = [fmt.format(paragraph) for paragraph in paragraphs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        batches = balanced_batches(paragraphs, workers * batches_per_worker)
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for formatted, batch_stats in pool.map(
+                    _format_batch, [formatter] * len(batches),
+                    [width] * len(batches), batches,
+                    [stats is not None] * len(batches),
+                    [hyphenator] * len(batches)):
+                results.extend(formatted)
+                if stats is not None:
+                    stats.merge(batch_stats)
+    return '\n\n'.join(results)
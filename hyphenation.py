@@ -0,0 +1,305 @@
+"""
+Liang-style hyphenation with compiled pattern files
+
+Usage:
+    python hyphenation.py PATTERNS -o OUTPUT [--left-min N] [--right-min N]
+
+Compiles TeX hyphenation patterns (a file with \\patterns{...} and
+optionally \\hyphenation{...} blocks, or just whitespace-separated
+patterns) into a double-array trie. Hyphenator memory-maps the
+compiled file, so loading it costs next to nothing however many
+patterns there are.
+"""
+import argparse
+import hashlib
+import mmap
+import re
+import struct
+import sys
+from array import array
+
+MAGIC = b'HYPH'
+VERSION = 1
+# magic, version, byte order, left_min, right_min, alphabet size,
+# trie slots, value bytes
+_HEADER = struct.Struct('<4sIBBBxIII')
+# levels given to exception words: above any pattern digit, odd
+# where the word may break
+_EXCEPTION_BREAK = 255
+_EXCEPTION_KEEP = 254
+_CORE = re.compile(r'(\W*)([^\W\d_]+)\W*$')
+
+
+def parse_patterns(text):
+    """
+    Patterns and exceptions from a TeX pattern file
+    Returns:
+        (patterns, exceptions): lists of strings such as 'hy3ph'
+        and 'ta-ble'
+    """
+    text = re.sub(r'(?<!\\)%.*', '', text)
+    blocks = dict((name, body) for name, body in
+                  re.findall(r'\\(patterns|hyphenation)\s*\{([^}]*)\}', text))
+    if not blocks:
+        return text.split(), []
+    return (blocks.get('patterns', '').split(),
+            blocks.get('hyphenation', '').split())
+
+
+def _pattern_levels(pattern):
+    """'hy3ph' -> ('hyph', [0, 0, 3, 0, 0])"""
+    letters = []
+    levels = [0]
+    for char in pattern:
+        if char.isdigit():
+            levels[-1] = int(char)
+        else:
+            letters.append(char)
+            levels.append(0)
+    return ''.join(letters), levels
+
+
+def _exception_levels(word):
+    """'ta-ble' -> ('.table.', levels that break only at the hyphens)"""
+    parts = word.lower().split('-')
+    letters = '.' + ''.join(parts) + '.'
+    levels = [0] + [_EXCEPTION_KEEP] * (len(letters) - 1) + [0]
+    pos = 1
+    for part in parts[:-1]:
+        pos += len(part)
+        levels[pos] = _EXCEPTION_BREAK
+    return letters, levels
+
+
+def compile_patterns(patterns, exceptions=(), left_min=2, right_min=3):
+    """
+    Compile patterns into the on-disk format Hyphenator loads
+    Args:
+        patterns: Liang patterns such as '.hy3p' or 'n2at'
+        exceptions: words hyphenated in full, such as 'ta-ble'
+        left_min: fewest letters before a hyphen
+        right_min: fewest letters after a hyphen
+    Returns:
+        bytes of the compiled file
+    """
+    entries = dict(_pattern_levels(p) for p in patterns)
+    entries.update(_exception_levels(word) for word in exceptions)
+    alphabet = sorted(set(''.join(entries)) | {'.'})
+    codes = dict((char, idx + 1) for idx, char in enumerate(alphabet))
+
+    # plain trie first, then pack it into base/check arrays
+    trie = [{}]
+    ends = {}
+    for letters, levels in entries.items():
+        node = 0
+        for char in letters:
+            child = trie[node].get(codes[char])
+            if child is None:
+                child = len(trie)
+                trie[node][codes[char]] = child
+                trie.append({})
+            node = child
+        ends[node] = bytes(levels)
+
+    base = array('i', [0])
+    check = array('i', [-1])
+    used = bytearray(b'\x01')
+    slot_of = {0: 0}
+    first_free = 1
+    queue = [0]
+    for node in queue:
+        children = sorted(trie[node])
+        if not children:
+            continue
+        # try each free slot for the first child; find() skips the
+        # packed ones quickly
+        first_free = used.find(0, first_free)
+        if first_free < 0:
+            first_free = len(used)
+        pos = first_free
+        while True:
+            start = max(pos - children[0], 1)
+            needed = start + children[-1] + 1
+            if needed > len(used):
+                grow = needed - len(used)
+                base.extend([0] * grow)
+                check.extend([-1] * grow)
+                used.extend(bytes(grow))
+            if not any(used[start + code] for code in children):
+                break
+            pos = used.find(0, pos + 1)
+            if pos < 0:
+                pos = len(used)
+        slot = slot_of[node]
+        base[slot] = start
+        for code in children:
+            used[start + code] = 1
+            check[start + code] = slot
+            slot_of[trie[node][code]] = start + code
+            queue.append(trie[node][code])
+
+    values = array('I', [0]) * len(check)
+    blob = bytearray()
+    offsets = {}
+    for node, levels in ends.items():
+        if levels not in offsets:
+            offsets[levels] = len(blob) + 1
+            blob += levels
+        values[slot_of[node]] = offsets[levels]
+
+    byteorder = 0 if sys.byteorder == 'little' else 1
+    return b''.join([
+        _HEADER.pack(MAGIC, VERSION, byteorder, left_min, right_min,
+                     len(alphabet), len(check), len(blob)),
+        array('I', map(ord, alphabet)).tobytes(),
+        base.tobytes(), check.tobytes(), values.tobytes(), bytes(blob)])
+
+
+class Hyphenator(object):
+    """
+    Hyphenation points from a compiled pattern file
+    The file is memory-mapped and read in place. Results are kept
+    for up to <cache_size> words.
+    Args:
+        path: file written by compile_patterns()
+        left_min: fewest letters before a hyphen, default the file's
+        right_min: fewest letters after a hyphen, default the file's
+        min_length: shortest word to hyphenate
+        cache_size: words whose hyphenation points are kept
+    """
+    def __init__(self, path, left_min=None, right_min=None, min_length=7,
+                 cache_size=65536):
+        self.path = path
+        self.cache_size = cache_size
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self._map)
+        (magic, version, byteorder, file_left, file_right, letters, slots,
+         blob_size) = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a compiled hyphenation file' % path)
+        if byteorder != (0 if sys.byteorder == 'little' else 1):
+            raise ValueError('%s was compiled on a machine of the other '
+                             'byte order' % path)
+        self.left_min = file_left if left_min is None else left_min
+        self.right_min = file_right if right_min is None else right_min
+        self.min_length = max(min_length, self.left_min + self.right_min)
+        pos = _HEADER.size
+        alphabet = data[pos:pos + 4 * letters].cast('I')
+        self._codes = dict((chr(code), idx + 1)
+                           for idx, code in enumerate(alphabet))
+        pos += 4 * letters
+        self._base = data[pos:pos + 4 * slots].cast('i')
+        pos += 4 * slots
+        self._check = data[pos:pos + 4 * slots].cast('i')
+        pos += 4 * slots
+        self._values = data[pos:pos + 4 * slots].cast('I')
+        pos += 4 * slots
+        self._blob = data[pos:pos + blob_size]
+        self._cache = {}
+        self._key = None
+
+    def __getstate__(self):
+        # the mapping can't be pickled; workers map the file again
+        return {'path': self.path, 'left_min': self.left_min,
+                'right_min': self.right_min, 'min_length': self.min_length,
+                'cache_size': self.cache_size}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def key(self):
+        """identifies the patterns and settings, for cache keys"""
+        if self._key is None:
+            digest = hashlib.blake2b(self._map, digest_size=8).hexdigest()
+            self._key = 'hyph-%s-%d-%d-%d' % (digest, self.left_min,
+                                              self.right_min, self.min_length)
+        return self._key
+
+    def positions(self, word):
+        """
+        Offsets in word where it may be hyphenated
+        Leading and trailing punctuation is ignored; words with
+        anything but letters in between, or shorter than min_length,
+        are not hyphenated.
+        Args:
+            word: one word, as text.split() gives
+        Returns:
+            tuple of offsets, ascending; word[:k] + '-' ends a line
+        """
+        if len(word) < self.min_length:
+            return ()
+        try:
+            return self._cache[word]
+        except KeyError:
+            pass
+        match = _CORE.match(word)
+        if match is None:
+            found = ()
+        else:
+            shift = len(match.group(1))
+            found = tuple(shift + k
+                          for k in self._core_positions(match.group(2)))
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[word] = found
+        return found
+
+    def split(self, word):
+        """word cut at its hyphenation points, e.g. ['hy', 'phen', 'ation']"""
+        cuts = (0,) + self.positions(word) + (len(word),)
+        return [word[a:b] for a, b in zip(cuts, cuts[1:])]
+
+    def _core_positions(self, letters):
+        size = len(letters)
+        if size < self.left_min + self.right_min:
+            return []
+        codes = self._codes
+        word = [codes.get(char, 0) for char in '.' + letters.lower() + '.']
+        base = self._base
+        check = self._check
+        values = self._values
+        blob = self._blob
+        slots = len(check)
+        levels = [0] * (len(word) + 1)
+        for start in range(len(word)):
+            node = 0
+            for end in range(start, len(word)):
+                code = word[end]
+                slot = base[node] + code
+                if not code or slot >= slots or check[slot] != node:
+                    break
+                node = slot
+                offset = values[node]
+                if offset:
+                    for k in range(end - start + 2):
+                        level = blob[offset - 1 + k]
+                        if level > levels[start + k]:
+                            levels[start + k] = level
+        # levels[k + 1] sits between letters[k - 1] and letters[k]
+        return [k for k in range(self.left_min, size - self.right_min + 1)
+                if levels[k + 1] % 2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('patterns', help='TeX pattern file')
+    parser.add_argument('-o', '--output', required=True,
+                        help='compiled file to write')
+    parser.add_argument('--left-min', type=int, default=2)
+    parser.add_argument('--right-min', type=int, default=3)
+    parser.add_argument('--encoding', default='utf-8')
+    args = parser.parse_args(argv)
+    with open(args.patterns, encoding=args.encoding) as f:
+        patterns, exceptions = parse_patterns(f.read())
+    data = compile_patterns(patterns, exceptions, args.left_min,
+                            args.right_min)
+    with open(args.output, 'wb') as f:
+        f.write(data)
+    print('%d patterns, %d exceptions, %d bytes'
+          % (len(patterns), len(exceptions), len(data)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
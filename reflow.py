@@ -0,0 +1,67 @@
+"""
+Reflow text files as justified paragraphs
+
+Usage:
+    python reflow.py [-w WIDTH] [-a {knuth-plass,greedy,box-glue}]
+                     [-j WORKERS] [-H PATTERNS] [-o OUTPUT] [FILE ...]
+
+Reads the files given, or stdin, and writes each one's paragraphs
+(separated by blank lines) justified to WIDTH columns, hyphenating
+words with a pattern file compiled by hyphenation.py if one is given.
+Only the headless formatters are imported, so startup stays quick.
+"""
+import argparse
+import sys
+
+from formatters import (BoxGlueFormatter, GreedyFormatter, KnuthPlassFormatter,
+                        format_document)
+
+ALGORITHMS = {
+    'knuth-plass': KnuthPlassFormatter,
+    'greedy': GreedyFormatter,
+    'box-glue': BoxGlueFormatter,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('files', nargs='*', help='input files, default stdin')
+    parser.add_argument('-w', '--width', type=int, default=72)
+    parser.add_argument('-a', '--algorithm', choices=sorted(ALGORITHMS),
+                        default='knuth-plass')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='processes to format paragraphs with')
+    parser.add_argument('-H', '--hyphenate', metavar='PATTERNS',
+                        help='compiled hyphenation patterns to break words with')
+    parser.add_argument('-o', '--output', help='output file, default stdout')
+    args = parser.parse_args(argv)
+    if args.width < 1:
+        parser.error('width must be at least 1')
+    hyphenator = None
+    if args.hyphenate:
+        from hyphenation import Hyphenator
+        hyphenator = Hyphenator(args.hyphenate)
+
+    formatter = ALGORITHMS[args.algorithm]
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for path in args.files or ['-']:
+            if path == '-':
+                text = sys.stdin.read()
+            else:
+                with open(path) as src:
+                    text = src.read()
+            result = format_document(text, args.width, workers=args.workers,
+                                     formatter=formatter,
+                                     hyphenator=hyphenator)
+            if result:
+                out.write(result)
+                out.write('\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,389 @@
+"""
+Local formatting service
+
+Usage:
+    python service.py [--host HOST] [--port PORT | --unix PATH]
+                      [--workers N] [--max-batch N] [--max-delay-ms MS]
+                      [--queue-size N]
+
+Serves the formatters over HTTP on a TCP port or a Unix socket:
+
+    POST /format          {"text": ..., "width": 72, "algorithm": "greedy"}
+                          -> {"result": ...}
+    POST /format-lines    one such request per line (JSON lines)
+                          -> one {"result": ...} per line, streamed in order,
+                          or {"error": ...} for a line that failed
+    GET  /metrics         latency, throughput and batching figures
+
+Requests arriving together are grouped by algorithm and width and
+formatted as one batch in a process pool. The queue in front of the
+pool is bounded: once it is full, reading further requests waits,
+which pushes back on the clients.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from formatters import BoxGlueFormatter, GreedyFormatter, KnuthPlassFormatter
+
+ALGORITHMS = {
+    'knuth-plass': KnuthPlassFormatter,
+    'greedy': GreedyFormatter,
+    'box-glue': BoxGlueFormatter,
+}
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _format_batch(algorithm, width, texts):
+    fmt = ALGORITHMS[algorithm](width)
+    return [fmt.format(text) for text in texts]
+
+
+def parse_job(job):
+    """(algorithm, width, text) from a decoded request, or BadRequest"""
+    if not isinstance(job, dict) or not isinstance(job.get('text'), str):
+        raise BadRequest('expected an object with a "text" string')
+    width = job.get('width', 72)
+    algorithm = job.get('algorithm', 'knuth-plass')
+    if not isinstance(width, int) or isinstance(width, bool) or width < 1:
+        raise BadRequest('"width" must be a positive integer')
+    if algorithm not in ALGORITHMS:
+        raise BadRequest('"algorithm" must be one of %s'
+                         % ', '.join(sorted(ALGORITHMS)))
+    return algorithm, width, job['text']
+
+
+class Metrics(object):
+    """Request and batch counters, with latencies of recent requests"""
+    def __init__(self, window=10000):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched = 0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.requests += 1
+        self.latencies.append(seconds)
+
+    def as_dict(self, queue_depth):
+        elapsed = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+
+        def percentile(pct):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1,
+                                 int(pct / 100.0 * len(latencies)))]
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'batches': self.batches,
+            'mean_batch': self.batched / self.batches if self.batches else 0.0,
+            'throughput': self.requests / elapsed if elapsed else 0.0,
+            'latency_p50': percentile(50),
+            'latency_p99': percentile(99),
+            'latency_max': latencies[-1] if latencies else 0.0,
+            'queue_depth': queue_depth,
+            'uptime': elapsed,
+        }
+
+
+class Batcher(object):
+    """
+    Collects queued requests into batches and formats them in a
+    process pool, or in this process if workers is 0
+    Args:
+        workers: processes in the pool
+        max_batch: most requests formatted in one batch
+        max_delay: seconds to wait for a batch to fill
+        queue_size: requests waiting before submit() blocks
+    """
+    def __init__(self, workers=os.cpu_count(), max_batch=64, max_delay=0.002,
+                 queue_size=1024):
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.metrics = Metrics()
+        self._pool = None
+        if workers:
+            # forked workers would inherit client sockets and keep them
+            # open, so start them from a clean process instead
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                'forkserver' if 'forkserver' in methods else 'spawn')
+            self._pool = ProcessPoolExecutor(workers, mp_context=context)
+        # keep every worker busy, with one batch queued behind each
+        self._slots = asyncio.Semaphore(max(1, workers) * 2)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def warm_up(self):
+        """start the workers now rather than on the first requests"""
+        if self._pool is None:
+            return
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(self._pool, _format_batch, 'greedy', 72, [''])
+            for _ in range(self.workers)])
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    async def submit(self, algorithm, width, text):
+        """format text, waiting while the queue is full"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((algorithm, width, text, future,
+                              time.monotonic()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(items) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(),
+                                                        timeout))
+                except asyncio.TimeoutError:
+                    break
+            groups = {}
+            for item in items:
+                groups.setdefault(item[:2], []).append(item)
+            for (algorithm, width), group in groups.items():
+                await self._slots.acquire()
+                asyncio.ensure_future(self._format(algorithm, width, group))
+
+    async def _format(self, algorithm, width, group):
+        try:
+            texts = [item[2] for item in group]
+            if self._pool is None:
+                results = _format_batch(algorithm, width, texts)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._pool, _format_batch, algorithm, width, texts)
+        except Exception as exc:
+            for item in group:
+                if not item[3].done():
+                    item[3].set_exception(exc)
+            return
+        finally:
+            self._slots.release()
+        self.metrics.batches += 1
+        self.metrics.batched += len(group)
+        now = time.monotonic()
+        for item, result in zip(group, results):
+            if not item[3].done():
+                item[3].set_result(result)
+                self.metrics.record(now - item[4])
+
+
+class FormatServer(object):
+    """A minimal HTTP/1.1 front end for a Batcher"""
+    def __init__(self, batcher, max_body=64 * 1024 * 1024):
+        self.batcher = batcher
+        self.max_body = max_body
+
+    async def handle(self, reader, writer):
+        try:
+            while await self._handle_one(reader, writer):
+                pass
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_one(self, reader, writer):
+        request_line = await reader.readline()
+        if not request_line:
+            return False
+        try:
+            method, path, version = request_line.decode('latin-1').split()
+        except ValueError:
+            await self._respond(writer, 400, {'error': 'bad request line'})
+            return False
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # the body can't be framed, so the connection can't be reused
+            await self._respond(writer, 400, {'error': 'bad content-length'})
+            return False
+        if length > self.max_body:
+            await self._respond(writer, 413, {'error': 'body too large'})
+            return False
+        body = await reader.readexactly(length) if length else b''
+        keep_alive = headers.get('connection', '').lower() != 'close' and \
+            version == 'HTTP/1.1'
+
+        if path == '/metrics' and method == 'GET':
+            await self._respond(writer, 200, self.batcher.metrics.as_dict(
+                self.batcher.queue.qsize()))
+        elif path == '/format' and method == 'POST':
+            await self._format_one(writer, body)
+        elif path == '/format-lines' and method == 'POST':
+            await self._format_lines(writer, body)
+        elif path in ('/metrics', '/format', '/format-lines'):
+            await self._respond(writer, 405, {'error': 'method not allowed'})
+        else:
+            await self._respond(writer, 404, {'error': 'not found'})
+        return keep_alive
+
+    async def _format_one(self, writer, body):
+        try:
+            job = parse_job(json.loads(body))
+        except (ValueError, BadRequest) as exc:
+            self.batcher.metrics.errors += 1
+            await self._respond(writer, 400, {'error': str(exc)})
+            return
+        try:
+            result = await self.batcher.submit(*job)
+        except Exception as exc:
+            self.batcher.metrics.errors += 1
+            await self._respond(writer, 500, {'error': str(exc)})
+            return
+        await self._respond(writer, 200, {'result': result})
+
+    async def _format_lines(self, writer, body):
+        """
+        Stream one reply per request line, in order. At most a batch
+        worth of lines is submitted ahead of the reply being written,
+        so a long body waits on the bounded queue like other clients.
+        """
+        try:
+            lines = body.decode('utf-8').splitlines()
+        except UnicodeDecodeError as exc:
+            self.batcher.metrics.errors += 1
+            await self._respond(writer, 400, {'error': str(exc)})
+            return
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: application/x-ndjson\r\n'
+                     b'Transfer-Encoding: chunked\r\n\r\n')
+        window = max(1, self.batcher.max_batch)
+        pending = deque()
+        try:
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    job = parse_job(json.loads(line))
+                except (ValueError, BadRequest) as exc:
+                    self.batcher.metrics.errors += 1
+                    pending.append({'error': str(exc)})
+                else:
+                    pending.append(
+                        asyncio.ensure_future(self.batcher.submit(*job)))
+                while len(pending) >= window:
+                    await self._write_reply(writer, pending.popleft())
+            while pending:
+                await self._write_reply(writer, pending.popleft())
+        finally:
+            for item in pending:
+                if not isinstance(item, dict):
+                    item.cancel()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _write_reply(self, writer, item):
+        """write one chunk of a /format-lines reply"""
+        if isinstance(item, dict):
+            reply = item
+        else:
+            try:
+                reply = {'result': await item}
+            except Exception as exc:
+                # the status line is out: report the failure in place
+                self.batcher.metrics.errors += 1
+                reply = {'error': str(exc)}
+        data = (json.dumps(reply) + '\n').encode('utf-8')
+        writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+        await writer.drain()
+
+    async def _respond(self, writer, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        writer.write(b'HTTP/1.1 %d %s\r\n'
+                     b'Content-Type: application/json\r\n'
+                     b'Content-Length: %d\r\n\r\n%s'
+                     % (status, REASONS[status].encode('latin-1'),
+                        len(data), data))
+        await writer.drain()
+
+
+async def serve(host='127.0.0.1', port=8765, unix=None, **batcher_args):
+    batcher = Batcher(**batcher_args)
+    await batcher.warm_up()
+    batcher.start()
+    server = FormatServer(batcher)
+    if unix:
+        listener = await asyncio.start_unix_server(server.handle, path=unix,
+                                                   backlog=1024)
+    else:
+        listener = await asyncio.start_server(server.handle, host, port,
+                                              backlog=1024)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, listener.close)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    except asyncio.CancelledError:
+        pass  # closed by a signal
+    finally:
+        await batcher.close()
+        if unix and os.path.exists(unix):
+            os.unlink(unix)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this Unix socket instead')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='formatting processes, 0 formats in the server')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-delay-ms', type=float, default=2.0)
+    parser.add_argument('--queue-size', type=int, default=1024)
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.host, args.port, args.unix,
+                      workers=args.workers, max_batch=args.max_batch,
+                      max_delay=args.max_delay_ms / 1000.0,
+                      queue_size=args.queue_size))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,20 @@
+"""Random paragraphs for the tests"""
+import random
+
+SIZES = (1, 2, 3, 4, 5, 7, 9, 14)
+
+
+def random_word(rnd, sizes=SIZES):
+    return ''.join(rnd.choice('abcdefghij') for _ in range(rnd.choice(sizes)))
+
+
+def random_paragraphs(seed, count, most=40, sizes=SIZES):
+    """
+    count (text, width) pairs; with the default sizes some words are
+    wider than the narrowest widths
+    """
+    rnd = random.Random(seed)
+    for _ in range(count):
+        text = ' '.join(random_word(rnd, sizes)
+                        for _ in range(rnd.randint(0, most)))
+        yield text, rnd.randint(5, 30)
@@ -0,0 +1,51 @@
+import pytest
+
+from formatters import (INF_PENALTY, Box, BoxGlueFormatter, Glue,
+                        GreedyFormatter, Penalty)
+from helpers import random_paragraphs
+
+
+def test_overfull_last_word():
+    result = BoxGlueFormatter(9).format('aa bb eeeeeeeeeeee')
+    assert result == 'aa     bb\neeeeeeeeeeee'
+
+
+def test_no_empty_or_merged_lines():
+    for text, width in random_paragraphs(4, 200):
+        lines = BoxGlueFormatter(width).format(text).split('\n')
+        if text:
+            assert all(lines)
+        assert ' '.join(lines).split() == text.split()
+
+
+def test_lines_fit_when_words_do():
+    for text, width in random_paragraphs(14, 200, sizes=(1, 2, 3, 4, 5)):
+        result = BoxGlueFormatter(width).format(text)
+        assert all(len(line) <= width for line in result.split('\n'))
+
+
+def test_rejects_shrink():
+    with pytest.raises(ValueError):
+        BoxGlueFormatter(40, shrink=0.5)
+
+
+def test_breaks_after_hyphens():
+    text = 'a well-known long-standing fact'
+    result = BoxGlueFormatter(12).format(text)
+    assert '-\n' in result
+    assert result.replace('-\n', '-').split() == text.split()
+
+
+def test_items_end_with_unbreakable_fill():
+    items = BoxGlueFormatter(20).build_items(['aa', 'bb'])
+    assert [type(item) for item in items] == [Box, Glue, Box, Penalty, Glue,
+                                              Penalty]
+    assert items[3].penalty == INF_PENALTY
+    assert items[5].penalty == -INF_PENALTY
+
+
+def test_total_fit():
+    # the paragraph as a whole decides the breaks, not each line
+    text = 'gh bj eg fjif j'
+    assert GreedyFormatter(6).format(text) == 'gh  bj\neg\nfjif j'
+    assert BoxGlueFormatter(6).format(text) == 'gh\nbj  eg\nfjif j'
@@ -0,0 +1,68 @@
+from formatters import (BoxGlueFormatter, FormatCache, FormatStats,
+                        GreedyFormatter, KnuthPlassFormatter, Paragraph,
+                        SqliteStore, TableMetrics)
+
+TEXT = 'the quick brown fox jumps over the lazy dog again and again'
+
+
+class SquareFormatter(KnuthPlassFormatter):
+    def badness(self, i, j):
+        length = self.line_length(i, j)
+        return float('inf') if length > self.width else \
+            (self.width - length) ** 2.0
+
+
+def test_lru_eviction():
+    cache = FormatCache(maxsize=2)
+    cache.put('a', '1')
+    cache.put('b', '2')
+    assert cache.get('a') == '1'  # b is now the least recently used
+    cache.put('c', '3')
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == ('1', '3')
+    assert cache.stats() == {'hits': 3, 'store_hits': 0, 'misses': 1,
+                             'evictions': 1, 'size': 2}
+
+
+def test_sqlite_round_trip(tmp_path):
+    path = str(tmp_path / 'results.db')
+    store = SqliteStore(path)
+    fmt = KnuthPlassFormatter(20, cache=FormatCache(store=store))
+    expected = fmt.format(TEXT)
+    store.close()
+    # a fresh cache, as in another process, reads it back from disk
+    store = SqliteStore(path)
+    cache = FormatCache(store=store)
+    assert cache.get(cache.key(KnuthPlassFormatter(20), TEXT)) == expected
+    assert cache.stats()['store_hits'] == 1
+    assert cache.get('missing') is None
+    store.close()
+
+
+def test_cached_format_matches_format():
+    stats = FormatStats()
+    fmt = KnuthPlassFormatter(20, cache=FormatCache(), stats=stats)
+    expected = KnuthPlassFormatter(20).format(TEXT)
+    assert fmt.format(TEXT) == expected
+    assert fmt.format(Paragraph(TEXT)) == expected
+    assert (stats.cache_misses, stats.cache_hits) == (1, 1)
+
+
+def test_keys_separate_layouts():
+    table = TableMetrics({'a': 1.5}, default=1.0, space=1.0)
+    formatters = [KnuthPlassFormatter(20), KnuthPlassFormatter(21),
+                  GreedyFormatter(20), BoxGlueFormatter(20),
+                  BoxGlueFormatter(20, tolerance=2.0), SquareFormatter(20),
+                  KnuthPlassFormatter(20, legacy_spacing=True),
+                  KnuthPlassFormatter(20, metrics=table)]
+    keys = {FormatCache.key(fmt, TEXT) for fmt in formatters}
+    assert len(keys) == len(formatters)
+    assert FormatCache.key(KnuthPlassFormatter(20), TEXT) != \
+        FormatCache.key(KnuthPlassFormatter(20), TEXT + ' more')
+
+
+def test_table_metrics_key_is_stable():
+    advances = {chr(code): 1.0 + code % 3 for code in range(32, 127)}
+    metrics = TableMetrics(advances)
+    assert metrics.key() == metrics.key() == TableMetrics(advances).key()
+    assert metrics.key() != TableMetrics(advances, default=9.0).key()
@@ -0,0 +1,26 @@
+import io
+
+import reflow
+from formatters import GreedyFormatter, KnuthPlassFormatter
+
+
+def test_files_to_output(tmp_path):
+    first = tmp_path / 'a.txt'
+    second = tmp_path / 'b.txt'
+    out = tmp_path / 'out.txt'
+    first.write_text('aa bb cc dd ee\n\nff gg hh ii jj kk\n')
+    second.write_text('ll mm nn oo\n')
+    assert reflow.main(['-w', '8', '-o', str(out), str(first),
+                        str(second)]) == 0
+    fmt = KnuthPlassFormatter(8)
+    assert out.read_text() == (
+        fmt.format('aa bb cc dd ee') + '\n\n' +
+        fmt.format('ff gg hh ii jj kk') + '\n' +
+        fmt.format('ll mm nn oo') + '\n')
+
+
+def test_stdin_to_stdout(monkeypatch, capsys):
+    monkeypatch.setattr('sys.stdin', io.StringIO('aa bb cc dd ee'))
+    assert reflow.main(['-w', '8', '-a', 'greedy']) == 0
+    assert capsys.readouterr().out == \
+        GreedyFormatter(8).format('aa bb cc dd ee') + '\n'
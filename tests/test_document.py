@@ -0,0 +1,42 @@
+from formatters import (FormatStats, GreedyFormatter, KnuthPlassFormatter,
+                        balanced_batches, format_document, split_paragraphs)
+from helpers import random_paragraphs
+
+
+def _document(seed, count):
+    return '\n\n'.join(text for text, _ in random_paragraphs(seed, count)
+                       if text)
+
+
+def test_split_paragraphs():
+    text = 'one two\nthree\n\n  \nfour\n \t\nfive\n\n'
+    assert [p.split() for p in split_paragraphs(text)] == [
+        ['one', 'two', 'three'], ['four'], ['five']]
+    assert split_paragraphs('') == []
+
+
+def test_balanced_batches_keep_order():
+    paragraphs = ['a' * size for size in (5, 1, 1, 9, 2, 2, 2, 7)]
+    batches = balanced_batches(paragraphs, 3)
+    assert [p for batch in batches for p in batch] == paragraphs
+    assert 2 <= len(batches) <= 4
+    assert balanced_batches([], 4) == []
+
+
+def test_format_document_matches_format():
+    text = _document(5, 30)
+    expected = '\n\n'.join(KnuthPlassFormatter(20).format(p)
+                           for p in split_paragraphs(text))
+    assert format_document(text, 20) == expected
+
+
+def test_format_document_workers():
+    text = _document(6, 60)
+    stats = FormatStats()
+    for formatter in (KnuthPlassFormatter, GreedyFormatter):
+        single = format_document(text, 24, formatter=formatter)
+        assert format_document(text, 24, workers=2, formatter=formatter,
+                               batches_per_worker=3, stats=stats) == single
+    # figures come back from the worker processes
+    assert stats.paragraphs == 2 * len(split_paragraphs(text))
+    assert stats.words == 2 * len(text.split())
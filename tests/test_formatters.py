@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from formatters import KnuthPlassFormatter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_legacy_spacing_matches_baseline():
+    # output of the original recursive formatter, overlong words included
+    with open(os.path.join(HERE, 'baseline_cases.json')) as f:
+        cases = json.load(f)
+    for case in cases:
+        fmt = KnuthPlassFormatter(case['width'], legacy_spacing=True)
+        assert fmt.format(case['text']) == case['expected']
+
+
+class SquareFormatter(KnuthPlassFormatter):
+    def badness(self, i, j):
+        length = self.line_length(i, j)
+        if length > self.width:
+            return float('inf')
+        return (self.width - length) ** 2.0
+
+
+def test_badness_override_is_used():
+    text = 'ajfjicd egaf ibd jbfc eihi acfhg jbcdifj hhf bhgjejiaa'
+    cubic = KnuthPlassFormatter(16)
+    square = SquareFormatter(16)
+    assert cubic.format(text) != square.format(text)
+    # the layout square found is the best under its own cost
+    square.tokenize(text)
+    best = square.best_break(0, len(square.words))
+    cubic.tokenize(text)
+    cubic.break_lines()
+    costs = []
+    for fmt in (square, cubic):
+        breaks = [0] + fmt.breakpoints()
+        costs.append(sum(square.badness(a, b)
+                         for a, b in zip(breaks, breaks[1:-1])))
+    assert costs[0] == best <= costs[1]
+
+
+def test_long_paragraph_without_recursion():
+    text = 'word ' * 50000
+    lines = KnuthPlassFormatter(30).format(text).split('\n')
+    assert sum(len(line.split()) for line in lines) == 50000
+
+
+def test_best_break_solves_suffixes_only():
+    fmt = KnuthPlassFormatter(10)
+    fmt.tokenize('aa bb cc')
+    with pytest.raises(ValueError):
+        fmt.best_break(0, 2)
@@ -0,0 +1,57 @@
+import pytest
+
+from formatters import GreedyFormatter
+from helpers import random_paragraphs
+
+
+def _first_fit(words, width):
+    """lines of words, each as full as it goes, the obvious way"""
+    lines = [[]]
+    for word in words:
+        if lines[-1] and len(' '.join(lines[-1] + [word])) > width:
+            lines.append([])
+        lines[-1].append(word)
+    return lines
+
+
+def test_greedy_lines_first_fit():
+    for text, width in random_paragraphs(10, 200):
+        words = text.split()
+        lines = list(GreedyFormatter(width).greedy_lines(words))
+        assert lines == (_first_fit(words, width) if words else [])
+
+
+def test_format_file_matches_format(tmp_path):
+    src = tmp_path / 'in.txt'
+    out = tmp_path / 'out.txt'
+    for text, width in random_paragraphs(11, 30):
+        text = text.replace(' ', ' \n\t ', 3)
+        src.write_text(text, encoding='utf-8')
+        fmt = GreedyFormatter(width)
+        count = fmt.format_file(str(src), str(out))
+        expected = GreedyFormatter(width).format(text)
+        assert out.read_text(encoding='utf-8') == expected + '\n'
+        assert count == (expected.count('\n') + 1 if text.split() else 0)
+
+
+def test_format_file_empty(tmp_path):
+    src = tmp_path / 'in.txt'
+    src.write_bytes(b'')
+    out = tmp_path / 'out.txt'
+    assert GreedyFormatter(10).format_file(str(src), str(out)) == 0
+    assert out.read_text() == '\n'
+
+
+def test_format_file_encodings(tmp_path):
+    text = 'caf\xe9 na\xefve r\xe9sum\xe9 \xfcber stra\xdfe'
+    src = tmp_path / 'in.txt'
+    out = tmp_path / 'out.txt'
+    for encoding in ('utf-8', 'latin-1', 'cp1252'):
+        src.write_bytes(text.encode(encoding))
+        GreedyFormatter(12).format_file(str(src), str(out), encoding)
+        assert out.read_bytes().decode(encoding) == \
+            GreedyFormatter(12).format(text) + '\n'
+    for encoding in ('utf-16', 'utf-32', 'iso-2022-jp', 'utf-7'):
+        src.write_bytes(text.encode('utf-8'))
+        with pytest.raises(ValueError):
+            GreedyFormatter(12).format_file(str(src), str(out), encoding)
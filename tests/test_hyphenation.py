@@ -0,0 +1,102 @@
+import pickle
+
+import pytest
+
+from formatters import (BoxGlueFormatter, FormatStats, GreedyFormatter,
+                        KnuthPlassFormatter)
+from hyphenation import Hyphenator, compile_patterns, parse_patterns
+
+PATTERNS = r"""
+% a few patterns, enough for 'communication'
+\patterns{
+m1m u1n 1ca a1t n2i
+}
+\hyphenation{
+ta-ble
+}
+"""
+
+
+@pytest.fixture
+def patterns_path(tmp_path):
+    patterns, exceptions = parse_patterns(PATTERNS)
+    path = tmp_path / 'test.hyph'
+    path.write_bytes(compile_patterns(patterns, exceptions))
+    return str(path)
+
+
+@pytest.fixture
+def hyphenator(patterns_path):
+    return Hyphenator(patterns_path)
+
+
+def test_parse_patterns():
+    assert parse_patterns(PATTERNS) == (
+        ['m1m', 'u1n', '1ca', 'a1t', 'n2i'], ['ta-ble'])
+    # a bare list is all patterns
+    assert parse_patterns('.hy3p n2at\n') == (['.hy3p', 'n2at'], [])
+
+
+def test_compile_rejects_other_files(tmp_path):
+    path = tmp_path / 'bad.hyph'
+    path.write_bytes(b'not a pattern file at all')
+    with pytest.raises(ValueError):
+        Hyphenator(str(path))
+
+
+def test_positions(hyphenator):
+    assert hyphenator.positions('communication') == (3, 5, 7, 9)
+    assert hyphenator.split('communication') == [
+        'com', 'mu', 'ni', 'ca', 'tion']
+    # case is ignored, surrounding punctuation shifts the offsets
+    assert hyphenator.positions('Communication') == (3, 5, 7, 9)
+    assert hyphenator.positions('"communication,"') == (4, 6, 8, 10)
+    # anything but letters inside the word, or a short word: no cuts
+    assert hyphenator.positions('commu2nication') == ()
+    assert hyphenator.positions('mummy') == ()
+
+
+def test_left_and_right_min(patterns_path):
+    wide = Hyphenator(patterns_path, left_min=4, right_min=5)
+    assert wide.positions('communication') == (5, 7)
+    assert Hyphenator(patterns_path, left_min=1).left_min == 1
+
+
+def test_exceptions(patterns_path):
+    hyphenator = Hyphenator(patterns_path, min_length=1)
+    assert hyphenator.positions('table') == (2,)
+    assert hyphenator.positions('tables') == ()
+
+
+def test_pickle(patterns_path):
+    hyphenator = Hyphenator(patterns_path, left_min=4, min_length=9)
+    copy = pickle.loads(pickle.dumps(hyphenator))
+    assert copy.key() == hyphenator.key()
+    assert copy.positions('communication') == \
+        hyphenator.positions('communication')
+    assert (copy.left_min, copy.min_length) == (4, 9)
+
+
+@pytest.mark.parametrize('cls', [KnuthPlassFormatter, GreedyFormatter,
+                                 BoxGlueFormatter])
+@pytest.mark.parametrize('text', ['aa communication bb',
+                                  'aaaaaa communication bb',
+                                  'communication bb'])
+def test_formatters_hyphenate_overlong_words(hyphenator, cls, text):
+    result = cls(10, hyphenator=hyphenator).format(text)
+    assert '-\n' in result
+    assert all(len(line) <= 10 for line in result.split('\n'))
+    assert result.replace('-\n', '').split() == text.split()
+
+
+def test_hyphenated_stats_count_words(hyphenator):
+    stats = FormatStats()
+    KnuthPlassFormatter(10, hyphenator=hyphenator, stats=stats).format(
+        'aa communication bb')
+    assert stats.words == 3
+
+
+def test_no_hyphenation_within_pretolerance(hyphenator):
+    text = 'aaaa bbbb communication cccc dddd eeee'
+    plain = KnuthPlassFormatter(40).format(text)
+    assert KnuthPlassFormatter(40, hyphenator=hyphenator).format(text) == plain
@@ -0,0 +1,65 @@
+import io
+
+from formatters import KnuthPlassFormatter, TableMetrics
+from helpers import random_paragraphs
+
+
+def test_expanded_fills_width():
+    fmt = KnuthPlassFormatter(30)
+    for text, _ in random_paragraphs(12, 100, sizes=(1, 2, 3, 4)):
+        words = text.split()[:6]
+        if len(words) < 2:
+            continue
+        line = fmt.expanded(words, 30)
+        assert len(line) == 30
+        assert line.split() == words
+        gaps = fmt.gaps(words, 30)
+        assert max(gaps) - min(gaps) <= 1
+
+
+def test_gaps_spread_evenly():
+    fmt = KnuthPlassFormatter(20)
+    # 3 extra spaces over 6 gaps land on every other gap
+    assert fmt.gaps(['a'] * 7, 16) == [1, 2, 1, 2, 1, 2]
+    assert fmt.gaps(['ab', 'cd'], 20) == [16]
+
+
+def test_legacy_gaps_are_stable():
+    fmt = KnuthPlassFormatter(20, legacy_spacing=True)
+    words = ['a', 'b', 'c', 'd', 'e']
+    gaps = fmt.gaps(words, 12)
+    assert sorted(gaps) == [1, 2, 2, 2]
+    assert fmt.gaps(words, 12) == gaps
+
+
+def test_single_word_and_empty_lines():
+    fmt = KnuthPlassFormatter(10)
+    assert fmt.expanded(['word'], 10) == 'word'
+    assert fmt.expanded([], 10) == ''
+
+
+def test_overflowing_line_keeps_spaces():
+    fmt = KnuthPlassFormatter(4)
+    assert fmt.expanded(['abc', 'def'], 4) == 'abc def'
+    assert fmt.expanded(['a', 'b', 'c'], 4) == 'a b c'
+
+
+def test_write_expanded_matches_expanded():
+    fmt = KnuthPlassFormatter(25)
+    out = io.StringIO()
+    fmt.write_expanded(out, ['one', 'two', 'three'], 25)
+    assert out.getvalue() == fmt.expanded(['one', 'two', 'three'], 25)
+
+
+def test_render_leaves_last_line_packed():
+    fmt = KnuthPlassFormatter(11)
+    assert fmt.render([['aa', 'bb'], ['cc', 'dd']]) == \
+        'aa' + ' ' * 7 + 'bb\ncc dd'
+    assert fmt.render([]) == ''
+
+
+def test_gaps_in_table_units():
+    metrics = TableMetrics({'m': 2.0}, default=1.0, space=1.0)
+    fmt = KnuthPlassFormatter(10, metrics=metrics)
+    # 'mm' is 4 units wide: 10 - 4 - 1 leaves 5 spaces for 1 gap
+    assert fmt.gaps(['mm', 'a'], 10) == [5]
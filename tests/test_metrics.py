@@ -0,0 +1,57 @@
+from formatters import (BoxGlueFormatter, CharMetrics, GreedyFormatter,
+                        KnuthPlassFormatter, TableMetrics, format_widths)
+from helpers import random_paragraphs
+
+ADVANCES = {char: 1.0 + (ord(char) % 3) * 0.5 for char in 'abcdefghij'}
+
+
+def test_char_metrics():
+    metrics = CharMetrics()
+    assert metrics.measure('word') == 4
+    assert list(metrics.widths(['a', 'bcd', ''])) == [1, 3, 0]
+    assert metrics.space == 1
+
+
+def test_table_metrics():
+    metrics = TableMetrics({'m': 2.5, 'i': 0.5, ' ': 0.75}, default=1.0)
+    assert metrics.space == 0.75
+    assert metrics.measure('mix') == 4.0
+    assert list(metrics.widths(['m', 'ii'])) == [2.5, 1.0]
+    # without a default, unknown characters are as wide as the widest
+    assert TableMetrics({'a': 1.0, 'b': 3.0}).measure('z') == 3.0
+
+
+def test_word_cache_is_bounded():
+    metrics = TableMetrics(ADVANCES, cache_size=4)
+    for count in range(1, 20):
+        assert metrics.measure('a' * count) == count * metrics.advance('a')
+    assert len(metrics._words) <= 4
+
+
+def _measured(metrics, line):
+    words = line.split()
+    return sum(map(metrics.measure, words)) + \
+        (len(words) - 1) * metrics.space
+
+
+def test_lines_fit_in_table_units():
+    metrics = TableMetrics(ADVANCES, default=1.0, space=1.0)
+    for text, width in random_paragraphs(13, 100, sizes=(1, 2, 3, 4)):
+        width += 3  # every word fits on a line
+        for cls in (KnuthPlassFormatter, GreedyFormatter, BoxGlueFormatter):
+            result = cls(width, metrics=metrics).format(text)
+            assert result.split() == text.split()
+            for line in result.split('\n'):
+                assert _measured(metrics, line) <= width
+
+
+def test_metrics_change_the_breaks():
+    text = 'jjj jjj jjj jjj jjj jjj'
+    wide = TableMetrics({'j': 2.0}, space=1.0)
+    assert KnuthPlassFormatter(11).format(text).count('\n') == 1
+    assert KnuthPlassFormatter(11, metrics=wide).format(text).count('\n') == 5
+
+
+def test_format_widths_uses_characters():
+    text = 'aa bbb c dddd'
+    assert format_widths(text, [6]) == {6: KnuthPlassFormatter(6).format(text)}
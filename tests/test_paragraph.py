@@ -0,0 +1,46 @@
+from formatters import (BoxGlueFormatter, FormatCache, GreedyFormatter,
+                        KnuthPlassFormatter, Paragraph, TableMetrics,
+                        format_widths)
+from helpers import random_paragraphs
+
+
+def test_behaves_as_word_list():
+    for text in ['', '  ', 'one', '\tfoo bar\x1cbaz  qux\n',
+                 ' caf\xe9  na\xefve done ']:
+        words = text.split()
+        paragraph = Paragraph(text)
+        assert len(paragraph) == len(words)
+        assert list(paragraph) == words
+        assert paragraph[:] == words
+        assert paragraph[1:-1] == words[1:-1]
+        if words:
+            assert (paragraph[0], paragraph[-1]) == (words[0], words[-1])
+
+
+def test_prefix_sums_kept_per_metrics():
+    paragraph = Paragraph('aa bbb c')
+    table = TableMetrics({'a': 2.0}, default=1.0, space=1.0)
+    assert list(paragraph.prefix_sums()) == [0, 2, 5, 6]
+    assert list(paragraph.prefix_sums(table)) == [0, 4, 7, 8]
+    assert paragraph.prefix_sums() is paragraph.prefix_sums()
+
+
+def test_matches_str():
+    table = TableMetrics({'a': 1.5, 'b': 0.5}, default=1.0, space=1.0)
+    for text, width in random_paragraphs(3, 60):
+        paragraph = Paragraph(text)
+        for cls in (KnuthPlassFormatter, GreedyFormatter, BoxGlueFormatter):
+            for options in ({}, {'metrics': table},
+                            {'cache': FormatCache()}):
+                assert cls(width, **options).format(paragraph) == \
+                    cls(width, **options).format(text)
+        for render in (True, False):
+            assert format_widths(paragraph, [width, 40], render) == \
+                format_widths(text, [width, 40], render)
+
+
+def test_reused_across_formatters():
+    paragraph = Paragraph('the same words at several widths ' * 5)
+    for width in (10, 20, 30):
+        assert KnuthPlassFormatter(width).format(paragraph) == \
+            KnuthPlassFormatter(width).format(paragraph.text)
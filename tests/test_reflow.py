@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from formatters import KnuthPlassFormatter, ReflowSession
+from helpers import random_word
+
+SIZES = (1, 1, 2, 3, 4, 5, 7, 12)
+
+
+def _random_edit(rnd, session):
+    start = rnd.randint(0, len(session.words))
+    end = rnd.randint(start, min(len(session.words),
+                                 start + rnd.choice([0, 1, 2, 5])))
+    return start, end, [random_word(rnd, SIZES)
+                        for _ in range(rnd.choice([0, 1, 2, 3]))]
+
+
+def _check_edit(session, start, end, replacement):
+    lines = list(session.lines)
+    first, removed, new_lines = session.apply_edit(start, end, replacement)
+    lines[first:first + removed] = new_lines
+    assert lines == session.lines
+
+
+def _formatted(session):
+    return KnuthPlassFormatter(session.width).format(' '.join(session.words))
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_matches_format(seed):
+    rnd = random.Random(seed)
+    for _ in range(40):
+        width = rnd.choice([3, 4, 6, 10, 16, 30])
+        session = ReflowSession(width, ' '.join(
+            random_word(rnd, SIZES) for _ in range(rnd.randint(0, 40))))
+        for _ in range(20):
+            _check_edit(session, *_random_edit(rnd, session))
+            assert session.text() == _formatted(session)
+        if rnd.random() < 0.3:
+            session.set_text(' '.join(
+                random_word(rnd, SIZES) for _ in range(rnd.randint(0, 40))))
+            assert session.text() == _formatted(session)
+
+
+@pytest.mark.parametrize('max_steps', [0, 2, 64])
+def test_pending_offsets(monkeypatch, max_steps):
+    # long sessions, so deferred score changes pile up and get folded
+    monkeypatch.setattr(ReflowSession, '_MAX_STEPS', max_steps)
+    rnd = random.Random(max_steps)
+    for _ in range(3):
+        width = rnd.choice([6, 16, 30])
+        session = ReflowSession(width, ' '.join(
+            random_word(rnd, SIZES) for _ in range(300)))
+        for edit in range(300):
+            _check_edit(session, *_random_edit(rnd, session))
+            if edit % 25 == 0:
+                assert session.text() == _formatted(session)
+        assert session.text() == _formatted(session)
+
+
+def test_overlong_word():
+    session = ReflowSession(4, 'eeeeeeeeeeee bb dddd ccc a')
+    session.apply_edit(5, 5, 'a')
+    assert session.text() == _formatted(session)
+
+
+def test_edit_that_changes_nothing():
+    session = ReflowSession(10, 'aa bb cc dd ee ff gg')
+    lines = list(session.lines)
+    assert session.apply_edit(0, 0, '') == (0, 0, [])
+    assert session.apply_edit(3, 3, []) == (1, 0, [])
+    assert session.apply_edit(1, 2, 'bb') == (0, 0, [])
+    assert session.set_text('aa  bb cc dd\nee ff gg')[1:] == (0, [])
+    assert session.lines == lines
+    assert ReflowSession(10).apply_edit(0, 0, '') == (0, 0, [])
+
+
+def test_only_changed_lines_are_emitted():
+    words = ['word'] * 200
+    session = ReflowSession(30, ' '.join(words))
+    first, removed, new_lines = session.apply_edit(100, 101, 'wordy')
+    assert removed == len(new_lines) < 4
+    assert session.text() == _formatted(session)
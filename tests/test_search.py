@@ -0,0 +1,51 @@
+from formatters import KnuthPlassFormatter, SearchIndex
+
+LINES = ['The cat sat,  on the', 'mat. Cats and the', '"cat" -- catalogue']
+
+
+def test_word_positions():
+    index = SearchIndex(LINES)
+    assert index.search('cat') == [(0, 4, 3), (2, 0, 5)]
+    assert index.search('THE') == [(0, 0, 3), (0, 17, 3), (1, 14, 3)]
+    assert index.search('dog') == []
+
+
+def test_prefix():
+    index = SearchIndex(LINES)
+    assert index.search('cat', prefix=True) == [
+        (0, 4, 3), (1, 5, 4), (2, 0, 5), (2, 9, 9)]
+    assert index.search('ca', prefix=True) == index.search('cat', prefix=True)
+
+
+def test_phrase_across_lines():
+    index = SearchIndex(LINES)
+    assert index.search('on the mat') == [(0, 14, 2)]
+    assert index.search('the mat cats') == [(0, 17, 3)]
+    assert index.search('the ma', prefix=True) == [(0, 17, 3)]
+    assert index.search('the ma') == []
+    assert index.search('catalogue extra') == []
+
+
+def test_punctuation_only_terms():
+    index = SearchIndex(LINES)
+    for query in ('--', '...', 'the --', '"'):
+        assert index.search(query) == []
+        assert index.search(query, prefix=True) == []
+    assert index.search('') == []
+
+
+def test_matches_formatted_text():
+    text = 'alpha beta gamma delta ' * 20
+    lines = KnuthPlassFormatter(17).format(text).split('\n')
+    index = SearchIndex(lines)
+    matches = index.search('gamma delta')
+    assert len(matches) == 20
+    for line, column, length in matches:
+        assert lines[line][column:column + length] == 'gamma'
+
+
+def test_highlighted():
+    index = SearchIndex(['a <b> c'])
+    html = index.highlighted(index.search('<b>'), color='red')
+    assert html == ('<div style="white-space:pre">a <span style='
+                    '"background-color:red">&lt;b&gt;</span> c</div>')
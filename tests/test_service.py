@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+import pytest
+
+import service
+from formatters import GreedyFormatter, KnuthPlassFormatter
+from service import BadRequest, Batcher, FormatServer, parse_job
+
+
+def test_parse_job():
+    assert parse_job({'text': 'a b'}) == ('knuth-plass', 72, 'a b')
+    assert parse_job({'text': '', 'width': 9, 'algorithm': 'greedy'}) == \
+        ('greedy', 9, '')
+    for job in (None, [], {}, {'text': 3}, {'text': 'a', 'width': 0},
+                {'text': 'a', 'width': '9'}, {'text': 'a', 'width': True},
+                {'text': 'a', 'algorithm': 'fancy'}):
+        with pytest.raises(BadRequest):
+            parse_job(job)
+
+
+async def _request(port, method, path, body=b'', headers=b''):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'%s %s HTTP/1.1\r\nConnection: close\r\n%s'
+                 b'Content-Length: %d\r\n\r\n%s'
+                 % (method, path, headers, len(body), body))
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    head, _, payload = data.partition(b'\r\n\r\n')
+    return int(head.split()[1]), payload
+
+
+def _serve(test, **batcher_args):
+    """run test(port, batcher) against a server formatting in-process"""
+    async def main():
+        batcher = Batcher(workers=0, **batcher_args)
+        batcher.start()
+        listener = await asyncio.start_server(
+            FormatServer(batcher).handle, '127.0.0.1', 0)
+        try:
+            await test(listener.sockets[0].getsockname()[1], batcher)
+        finally:
+            listener.close()
+            await batcher.close()
+    asyncio.run(main())
+
+
+def test_format():
+    async def test(port, batcher):
+        body = json.dumps({'text': 'aa bb cc dd', 'width': 5}).encode()
+        status, payload = await _request(port, b'POST', b'/format', body)
+        assert status == 200
+        assert json.loads(payload) == {
+            'result': KnuthPlassFormatter(5).format('aa bb cc dd')}
+        status, payload = await _request(port, b'GET', b'/metrics')
+        assert status == 200 and json.loads(payload)['requests'] == 1
+        assert (await _request(port, b'GET', b'/format'))[0] == 405
+        assert (await _request(port, b'GET', b'/nowhere'))[0] == 404
+    _serve(test)
+
+
+def test_bad_requests():
+    async def test(port, batcher):
+        for length in (b'abc', b'-5'):
+            status, _ = await _request(
+                port, b'POST', b'/format',
+                headers=b'Content-Length: %s\r\n' % length)
+            assert status == 400
+        status, _ = await _request(port, b'POST', b'/format', b'{not json')
+        assert status == 400
+        status, _ = await _request(port, b'POST', b'/format-lines',
+                                   b'\xff\xfe')
+        assert status == 400
+    _serve(test)
+
+
+def test_worker_failure(monkeypatch):
+    def failing(algorithm, width, texts):
+        raise RuntimeError('boom')
+    monkeypatch.setattr(service, '_format_batch', failing)
+
+    async def test(port, batcher):
+        body = json.dumps({'text': 'aa'}).encode()
+        status, payload = await _request(port, b'POST', b'/format', body)
+        assert status == 500 and json.loads(payload) == {'error': 'boom'}
+    _serve(test)
+
+
+def _chunks(payload):
+    """the JSON objects of a chunked /format-lines reply"""
+    replies = []
+    while True:
+        size, _, payload = payload.partition(b'\r\n')
+        size = int(size, 16)
+        if not size:
+            return replies
+        replies.append(json.loads(payload[:size]))
+        payload = payload[size + 2:]
+
+
+def test_format_lines_in_order_and_bounded():
+    texts = ['line %d aa bb' % k for k in range(50)]
+    lines = [json.dumps({'text': text, 'width': 6, 'algorithm': 'greedy'})
+             for text in texts]
+    lines[9] = 'nope'
+
+    async def test(port, batcher):
+        deepest = 0
+
+        async def watch():
+            nonlocal deepest
+            while True:
+                deepest = max(deepest, batcher.queue.qsize())
+                await asyncio.sleep(0)
+        watcher = asyncio.ensure_future(watch())
+        status, payload = await _request(port, b'POST', b'/format-lines',
+                                         '\n'.join(lines).encode())
+        watcher.cancel()
+        assert status == 200
+        replies = _chunks(payload)
+        assert len(replies) == 50
+        assert 'error' in replies[9]
+        for k, reply in enumerate(replies):
+            if k != 9:
+                assert reply == {'result': GreedyFormatter(6).format(texts[k])}
+        assert deepest <= 4
+    _serve(test, max_batch=4, queue_size=4)
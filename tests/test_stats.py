@@ -0,0 +1,47 @@
+import pickle
+
+from formatters import (BoxGlueFormatter, FormatCache, FormatStats,
+                        GreedyFormatter, KnuthPlassFormatter)
+
+TEXT = 'the quick brown fox jumps over the lazy dog again and again'
+
+
+def test_formatters_record_figures():
+    for cls in (KnuthPlassFormatter, GreedyFormatter, BoxGlueFormatter):
+        seen = []
+        stats = FormatStats(callback=seen.append)
+        fmt = cls(20, stats=stats)
+        result = fmt.format(TEXT)
+        assert result == cls(20).format(TEXT)
+        assert (stats.paragraphs, stats.words, stats.max_words) == (1, 12, 12)
+        assert stats.lines == result.count('\n') + 1
+        assert stats.cells > 0
+        assert set(stats.timings) == set(FormatStats.PHASES)
+        assert len(seen) == 1 and seen[0]['words'] == 12
+
+
+def test_cache_hits_counted():
+    stats = FormatStats()
+    fmt = KnuthPlassFormatter(20, stats=stats, cache=FormatCache())
+    for _ in range(3):
+        fmt.format(TEXT)
+    assert (stats.cache_hits, stats.cache_misses) == (2, 1)
+    assert stats.cache_hit_rate() == 2 / 3
+    # hits are not formatted again
+    assert stats.paragraphs == 1
+
+
+def test_merge_and_pickle():
+    first = FormatStats(callback=lambda figures: None)
+    second = FormatStats()
+    KnuthPlassFormatter(20, stats=first).format(TEXT)
+    KnuthPlassFormatter(30, stats=second).format(TEXT + ' and more')
+    copy = pickle.loads(pickle.dumps(first))
+    assert copy.callback is None
+    copy.merge(second)
+    figures = copy.as_dict()
+    assert figures['paragraphs'] == 2
+    assert figures['words'] == 26
+    assert figures['max_words'] == 14
+    assert figures['timings']['break'] == \
+        first.timings['break'] + second.timings['break']
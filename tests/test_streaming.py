@@ -0,0 +1,58 @@
+import pytest
+
+from formatters import KnuthPlassFormatter, iter_words
+from helpers import random_paragraphs
+
+
+def _score(text, width):
+    """cubic badness of every line but the last, as format() minimises"""
+    lines = text.split('\n')
+    return sum((width - len(' '.join(line.split()))) ** 3
+               for line in lines[:-1])
+
+
+def _chunks(text, size=7):
+    return [text[k:k + size] for k in range(0, len(text), size)]
+
+
+def test_iter_words():
+    text = '  one two\tthree\n\nfour  fivesix '
+    for size in range(1, len(text) + 1):
+        assert list(iter_words(_chunks(text, size))) == text.split()
+    assert list(iter_words([])) == []
+
+
+@pytest.mark.parametrize('check_every', [1, 2, 3, 7, 256])
+def test_iter_format_reaches_format_score(check_every):
+    # words no wider than the line, where both have a finite score;
+    # small check_every emits lines and trims the tables mid-stream
+    for text, width in random_paragraphs(1, 150, most=80,
+                                         sizes=(1, 2, 3, 4, 5)):
+        fmt = KnuthPlassFormatter(width)
+        streamed = '\n'.join(fmt.iter_format(_chunks(text),
+                                             check_every=check_every))
+        formatted = KnuthPlassFormatter(width).format(text)
+        assert streamed.split() == formatted.split()
+        assert _score(streamed, width) == _score(formatted, width)
+        assert all(len(line) <= width for line in streamed.split('\n'))
+
+
+def test_iter_format_streams():
+    read = []
+
+    def chunks():
+        for k in range(2000):
+            read.append(k)
+            yield 'word%d ' % (k % 10)
+    lines = KnuthPlassFormatter(30).iter_format(chunks(), check_every=16)
+    next(lines)
+    # the first line is final long before the input ends
+    assert len(read) < 100
+    assert len(list(lines)) > 100
+
+
+def test_iter_format_overlong_word():
+    lines = list(KnuthPlassFormatter(5).iter_format(
+        ['aa bb ', 'cccccccc dd'], check_every=1))
+    assert lines == ['aa bb', 'cccccccc', 'dd']
+    assert list(KnuthPlassFormatter(5).iter_format([])) == ['']
@@ -0,0 +1,58 @@
+import sys
+
+import pytest
+
+import formatters
+from formatters import KnuthPlassFormatter, format_widths
+from helpers import random_paragraphs
+
+WIDTHS = range(5, 31)
+
+
+def test_format_widths_matches_format():
+    for text, _ in random_paragraphs(2, 60):
+        results = format_widths(text, WIDTHS)
+        for width in WIDTHS:
+            assert results[width] == KnuthPlassFormatter(width).format(text)
+
+
+def test_breakpoints_match_best_break():
+    for text, _ in random_paragraphs(7, 30):
+        results = format_widths(text, WIDTHS, render=False)
+        for width in WIDTHS:
+            fmt = KnuthPlassFormatter(width)
+            fmt.tokenize(text)
+            fmt.break_lines()
+            assert results[width] == fmt.breakpoints()
+
+
+def test_sweep_across_blocks():
+    # blocks far smaller than the paragraph, so lines cross them
+    numpy = pytest.importorskip('numpy')
+    for text, _ in random_paragraphs(8, 10, most=120):
+        words = text.split()
+        prefix = KnuthPlassFormatter.prefix_sums(words)
+        whole = formatters._sweep_parents(prefix, list(WIDTHS))
+        small = formatters._sweep_parents(prefix, list(WIDTHS), block=3)
+        assert numpy.array_equal(whole, small)
+
+
+def test_without_numpy(monkeypatch):
+    text = next(random_paragraphs(9, 1, most=60))[0]
+    expected = format_widths(text, WIDTHS)
+    monkeypatch.setitem(sys.modules, 'numpy', None)
+    assert format_widths(text, WIDTHS) == expected
+
+
+def test_empty():
+    assert format_widths('', [10, 20]) == {10: '', 20: ''}
+    assert format_widths('a b', []) == {}
+
+
+@pytest.mark.parametrize('widths', [[30, 5, 5, 12], range(1, 4)])
+def test_unsorted_and_narrow_widths(widths):
+    text = 'aa bbb c dddd eeeee ff g'
+    results = format_widths(text, widths)
+    assert sorted(results) == sorted(set(widths))
+    for width in widths:
+        assert results[width] == KnuthPlassFormatter(width).format(text)